@@ -0,0 +1,70 @@
+# Per-request overhead of the JSON-RPC endpoints in coppelia_mcp.py
+#
+# Usage: python benchmarks/bench_dispatch.py [--requests 2000]
+#
+# Drives the FastAPI app in-process (no network) with a stub simulator, so the
+# numbers are the server's own routing, schema building and serialization cost.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx
+
+
+class StubSim:
+    """Answers the few calls rotate_joint needs, instantly."""
+
+    def getObject(self, path):
+        return 1
+
+    def getObjectHandle(self, name):
+        return 1
+
+    def setJointTargetPosition(self, handle, angle):
+        pass
+
+
+REQUESTS = {
+    "initialize": {"method": "initialize", "params": {}},
+    "tools/list": {"method": "tools/list"},
+    "prompts/list": {"method": "prompts/list"},
+    "tools/call rotate_joint": {"method": "tools/call", "params": {
+        "name": "rotate_joint", "arguments": {"joint_name": "joint", "angle_deg": 10}}},
+    "unknown method": {"method": "does/not/exist"},
+}
+
+
+async def bench(app, path: str, count: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for name, request in REQUESTS.items():
+            body = {"jsonrpc": "2.0", "id": 1, **request}
+            await http.post(path, json=body)
+            started = time.perf_counter()
+            for _ in range(count):
+                await http.post(path, json=body)
+            elapsed = time.perf_counter() - started
+            print(f"  {path:5} {name:26} {elapsed / count * 1e6:9.1f} us/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON-RPC dispatch overhead")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per method")
+    parser.add_argument("--log-level", default="WARNING",
+                        help="Server log level (INFO adds a log line per request, written to stderr)")
+    args = parser.parse_args()
+
+    os.environ["MCP_LOG_LEVEL"] = args.log_level
+    import coppelia_mcp
+    coppelia_mcp.sim_pool.default.connection.use(None, StubSim())
+    for path in ("/", "/sse"):
+        asyncio.run(bench(coppelia_mcp.app, path, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Encoding cost of a large describe_scene response
+#
+# Usage: python benchmarks/bench_json.py [--objects 5000] [--repeat 20]
+#
+# Compares FastAPI's generic path (jsonable_encoder, then json.dumps), the
+# stdlib fallback of jsonfast.dumps and orjson (when installed) on a synthetic
+# structured describe_scene result.
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import jsonfast
+
+
+def scene_result(count: int) -> dict:
+    rng = random.Random(0)
+    objects = [{
+        "name": f"object{i}",
+        "type": rng.randrange(12),
+        "position": [rng.uniform(-5, 5) for _ in range(3)],
+        "orientation": [rng.uniform(-3.2, 3.2) for _ in range(3)],
+    } for i in range(count)]
+    return {"jsonrpc": "2.0", "id": 1, "result": {"structuredContent": {"objects": objects}}}
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def timed(encode, payload, repeat: int) -> float:
+    encode(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(payload)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding of scene responses")
+    parser.add_argument("--objects", type=int, default=5000, help="Number of scene objects")
+    parser.add_argument("--repeat", type=int, default=20, help="Encodings per encoder")
+    args = parser.parse_args()
+
+    payload = scene_result(args.objects)
+    encoders = {}
+    try:
+        from fastapi.encoders import jsonable_encoder
+        encoders["fastapi jsonable_encoder"] = lambda obj: json.dumps(jsonable_encoder(obj))
+    except ImportError:
+        pass
+    encoders["stdlib json (fallback)"] = stdlib_dumps
+    if jsonfast.orjson is not None:
+        encoders["orjson (jsonfast.dumps)"] = jsonfast.dumps
+
+    print(f"{args.objects} objects, {len(stdlib_dumps(payload)) / 1024:.0f} KiB encoded, backend: {jsonfast.BACKEND}")
+    baseline = None
+    for name, encode in encoders.items():
+        elapsed = timed(encode, payload, args.repeat)
+        baseline = baseline or elapsed
+        print(f"  {name:26} {elapsed * 1e3:8.2f} ms  ({baseline / elapsed:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Single-socket vs. split scene queries over several client connections
+#
+# Usage: python benchmarks/bench_parallel.py [--sizes 1000,5000] [--readers 0,1,3]
+#        python benchmarks/bench_parallel.py --no-lua --sizes 500,2000
+#
+# Times a cold describe_scene (static and dynamic fetch) and a dynamic refresh
+# on fake_sim.FakeSim, with a ReaderPool of N extra connections (0 = the single
+# socket path). Each connection's calls overlap with the others', as they would
+# on separate ZMQ sockets; `--item-latency` charges batched helpers per object,
+# so splitting has something to win with the Lua helpers too. Every run checks
+# that the merged result equals the single-socket one.
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tools
+from cache import SceneCache
+from fake_sim import FakeClient, FakeSim
+from readers import ReaderPool
+
+
+def run(sim, readers, repeat: int):
+    """Return (describe_scene result, best cold ms, best dynamic refresh ms)."""
+    cold = refresh = float("inf")
+    for _ in range(repeat):
+        cache = SceneCache(readers=readers)
+        started = time.perf_counter()
+        result = tools.describe_scene(sim, cache=cache)
+        cold = min(cold, time.perf_counter() - started)
+        sim.step()  # New simulation time: the next call refetches the dynamic tier only
+        started = time.perf_counter()
+        tools.describe_scene(sim, cache=cache)
+        refresh = min(refresh, time.perf_counter() - started)
+    return result, cold * 1000, refresh * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scene queries split across client connections")
+    parser.add_argument("--sizes", default="1000,5000", help="Comma-separated object counts")
+    parser.add_argument("--readers", default="0,1,3", help="Comma-separated reader connection counts")
+    parser.add_argument("--latency", type=float, default=0.0002, help="Simulated seconds per simulator call")
+    parser.add_argument("--item-latency", type=float, default=0.00002,
+                        help="Simulated seconds per object read by a batched helper")
+    parser.add_argument("--chunk", type=int, default=250, help="Fewest handles per chunk (MCP_PARALLEL_CHUNK)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    parser.add_argument("--no-lua", action="store_true", help="Disable the batched Lua helpers (per-object calls)")
+    args = parser.parse_args()
+
+    print(f"latency {args.latency * 1000:g} ms/call, {args.item_latency * 1e6:g} us/object, "
+          f"batched Lua helpers {'off' if args.no_lua else 'on'}")
+    print(f"  {'objects':>8} {'readers':>8} {'cold ms':>9} {'speedup':>8} {'refresh ms':>11} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        sim = FakeSim(objects=size, latency=args.latency, item_latency=args.item_latency, lua=not args.no_lua)
+        baseline = None
+        for count in (int(n) for n in args.readers.split(",")):
+            readers = ReaderPool(lambda: (FakeClient(sim), sim), size=count, min_chunk=args.chunk) if count else None
+            result, cold, refresh = run(sim, readers, args.repeat)
+            if baseline is None:
+                baseline = result, cold, refresh
+            elif result != baseline[0]:
+                raise SystemExit(f"{size} objects, {count} readers: result differs from the single-socket path")
+            print(f"  {size:8} {count:8} {cold:9.1f} {baseline[1] / cold:7.2f}x "
+                  f"{refresh:11.1f} {baseline[2] / refresh:7.2f}x")
+            if readers is not None:
+                readers.shutdown()
+
+
+if __name__ == "__main__":
+    main()
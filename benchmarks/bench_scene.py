@@ -0,0 +1,172 @@
+# Tool and endpoint cost across scene sizes, against the simulated backend
+#
+# Usage: python benchmarks/bench_scene.py [--sizes 10,100,1000] [--latency 0.0005]
+#        python benchmarks/bench_scene.py --save benchmarks/baseline.json
+#        python benchmarks/bench_scene.py --check benchmarks/baseline.json
+#
+# Every case runs on fake_sim.FakeSim, which charges `latency` seconds per
+# simulator call, and reports simulator round-trips (RPCs) per call and the
+# fastest wall time of a call.
+# "cold" cases start from an empty scene cache, "warm" ones repeat the call on a
+# filled cache. With --check, the run fails (exit code 1) when a case makes more
+# RPCs than the baseline, or is slower than the baseline by more than --tolerance.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tools
+from cache import SceneCache
+from fake_sim import FakeSim
+
+TOOL_CASES = {
+    "describe_scene": lambda sim, cache, i: tools.describe_scene(sim, cache=cache),
+    "describe_robot": lambda sim, cache, i: tools.describe_robot(sim, cache=cache),
+    "list_joints": lambda sim, cache, i: tools.list_joints(sim, cache=cache),
+    "rotate_joint": lambda sim, cache, i: tools.rotate_joint(sim, "joint1", 10 + i % 2, cache=cache),
+    "set_joint_positions": lambda sim, cache, i: tools.set_joint_positions(
+        sim, {"joint1": 10 + i % 2, "joint2": 20}, cache=cache),
+}
+
+RPC_CASES = {
+    "tools/list": {"method": "tools/list"},
+    "describe_scene": {"method": "tools/call", "params": {"name": "describe_scene"}},
+    "describe_scene structured": {"method": "tools/call", "params": {
+        "name": "describe_scene", "arguments": {"output": "structured"}}},
+    "describe_robot": {"method": "tools/call", "params": {"name": "describe_robot"}},
+    "list_joints": {"method": "tools/call", "params": {"name": "list_joints"}},
+    "rotate_joint": {"method": "tools/call", "params": {
+        "name": "rotate_joint", "arguments": {"joint_name": "joint1", "angle_deg": 10}}},
+    "batch of 3 describes": [
+        {"method": "tools/call", "params": {"name": "describe_scene"}},
+        {"method": "tools/call", "params": {"name": "describe_robot"}},
+        {"method": "tools/call", "params": {"name": "list_joints"}},
+    ],
+}
+
+
+def measure(sim, call, repeat: int):
+    """Return (RPCs per call, fastest call in ms) over `repeat` calls."""
+    rpcs = sim.rpc_count
+    best = float("inf")
+    for i in range(repeat):
+        started = time.perf_counter()
+        call(i)
+        best = min(best, time.perf_counter() - started)
+    return (sim.rpc_count - rpcs) / repeat, best * 1000
+
+
+def combine(samples):
+    # Mean RPC count, fastest time: the minimum is the least noisy latency estimate
+    return sum(rpcs for rpcs, _ in samples) / len(samples), min(ms for _, ms in samples)
+
+
+def bench_tools(size: int, args) -> dict:
+    results = {}
+    for name, run in TOOL_CASES.items():
+        cold = []
+        for _ in range(args.repeat):
+            sim = FakeSim(objects=size, robots=args.robots, latency=args.latency, lua=not args.no_lua)
+            cache = SceneCache()
+            cold.append(measure(sim, lambda i: run(sim, cache, i), 1))
+        results[f"{size}/tool/{name}/cold"] = combine(cold)
+        results[f"{size}/tool/{name}/warm"] = measure(sim, lambda i: run(sim, cache, i), args.repeat)
+    return results
+
+
+async def bench_rpc(size: int, args) -> dict:
+    import httpx
+    import coppelia_mcp
+
+    async def post(sim, body, repeat):
+        rpcs = sim.rpc_count
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await http.post("/", json=body)
+            best = min(best, time.perf_counter() - started)
+            if '"error"' in response.text:
+                raise Exception(f"{body} failed: {response.text[:200]}")
+        return (sim.rpc_count - rpcs) / repeat, best * 1000
+
+    results = {}
+    transport = httpx.ASGITransport(app=coppelia_mcp.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for name, request in RPC_CASES.items():
+            if isinstance(request, list):
+                body = [{"jsonrpc": "2.0", "id": i, **r} for i, r in enumerate(request)]
+            else:
+                body = {"jsonrpc": "2.0", "id": 1, **request}
+            cold = []
+            for _ in range(args.repeat):
+                sim = FakeSim(objects=size, robots=args.robots, latency=args.latency, lua=not args.no_lua)
+                instance = coppelia_mcp.sim_pool.default
+                instance.connection.use(None, sim)
+                instance.cache.invalidate()
+                cold.append(await post(sim, body, 1))
+            results[f"{size}/rpc/{name}/cold"] = combine(cold)
+            results[f"{size}/rpc/{name}/warm"] = await post(sim, body, args.repeat)
+    return results
+
+
+def check(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for key, (rpcs, ms) in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if rpcs > base["rpcs"]:
+            regressions.append(f"{key}: {rpcs:g} RPCs per call, baseline {base['rpcs']:g}")
+        # 1 ms of slack keeps sub-millisecond cases from flapping
+        if ms > base["ms"] * tolerance + 1.0:
+            regressions.append(f"{key}: {ms:.2f} ms per call, baseline {base['ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tools and JSON-RPC endpoints on a simulated scene")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated object counts")
+    parser.add_argument("--robots", type=int, default=2, help="Robots per scene (6 joints each)")
+    parser.add_argument("--latency", type=float, default=0.0005, help="Simulated seconds per simulator call")
+    parser.add_argument("--repeat", type=int, default=5, help="Calls per case")
+    parser.add_argument("--no-lua", action="store_true", help="Disable the batched Lua helpers (per-object calls)")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as a new baseline")
+    parser.add_argument("--check", metavar="PATH", help="Compare against a baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="Allowed slowdown factor for --check")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MCP_LOG_LEVEL", "WARNING")
+    # Warm-up pass, so imports and first-call costs are not charged to the first case
+    bench_tools(10, args)
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        results.update(bench_tools(size, args))
+        results.update(asyncio.run(bench_rpc(size, args)))
+
+    print(f"latency {args.latency * 1000:g} ms/call, batched Lua helpers {'off' if args.no_lua else 'on'}")
+    print(f"  {'case':52} {'RPCs':>7} {'best ms':>9}")
+    for key, (rpcs, ms) in results.items():
+        print(f"  {key:52} {rpcs:7g} {ms:9.2f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({key: {"rpcs": rpcs, "ms": round(ms, 3)} for key, (rpcs, ms) in results.items()},
+                      f, indent=1)
+            f.write("\n")
+    if args.check:
+        with open(args.check) as f:
+            regressions = check(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.check)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Startup time and round-trip latency of coppelia_mcp.py over stdio vs. HTTP
+#
+# Usage: python benchmarks/bench_stdio.py [--requests 2000] [--fake-sim objects=100]
+#
+# Spawns the server with the simulated backend, once with --stdio and once on a
+# free HTTP port, and reports the time until `initialize` is answered, then the
+# mean sequential round-trip of tools/list and rotate_joint from one client.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from load_test import ROOT, free_port
+
+REQUESTS = {
+    "tools/list": {"method": "tools/list"},
+    "rotate_joint": {"method": "tools/call", "params": {
+        "name": "rotate_joint", "arguments": {"joint_name": "joint1", "angle_deg": 10}}},
+}
+INITIALIZE = {"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {}}
+
+
+def server_env(fake_sim: str) -> dict:
+    return dict(os.environ, MCP_FAKE_SIM=fake_sim, MCP_LOG_LEVEL="WARNING")
+
+
+def bench_stdio(args) -> dict:
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "coppelia_mcp.py", "--stdio"], cwd=ROOT, env=server_env(args.fake_sim),
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def call(body):
+        process.stdin.write(json.dumps(body).encode() + b"\n")
+        process.stdin.flush()
+        return json.loads(process.stdout.readline())
+
+    try:
+        call(INITIALIZE)
+        results = {"startup": time.perf_counter() - started}
+        for name, request in REQUESTS.items():
+            call({"jsonrpc": "2.0", "id": 1, **request})  # Connects the simulator, warms caches
+            started = time.perf_counter()
+            for i in range(args.requests):
+                if "error" in call({"jsonrpc": "2.0", "id": i, **request}):
+                    raise SystemExit(f"stdio {name} failed")
+            results[name] = (time.perf_counter() - started) / args.requests
+    finally:
+        process.stdin.close()
+        process.wait()
+    return results
+
+
+def bench_http(args) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "coppelia_mcp.py", "--host", "127.0.0.1", "--port", str(port)],
+                               cwd=ROOT, env=server_env(args.fake_sim),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as http:
+            while True:
+                try:
+                    http.post("/", json=INITIALIZE)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            results = {"startup": time.perf_counter() - started}
+            for name, request in REQUESTS.items():
+                http.post("/", json={"jsonrpc": "2.0", "id": 1, **request})
+                started = time.perf_counter()
+                for i in range(args.requests):
+                    if "error" in http.post("/", json={"jsonrpc": "2.0", "id": i, **request}).json():
+                        raise SystemExit(f"HTTP {name} failed")
+                results[name] = (time.perf_counter() - started) / args.requests
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the stdio and HTTP transports of coppelia_mcp.py")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per method")
+    parser.add_argument("--fake-sim", default="objects=100", help="Simulated backend of the spawned servers")
+    args = parser.parse_args()
+
+    stdio, http = bench_stdio(args), bench_http(args)
+    print(f"  {'':14} {'stdio':>10} {'HTTP':>10}")
+    print(f"  {'startup':14} {stdio['startup'] * 1000:8.0f}ms {http['startup'] * 1000:8.0f}ms")
+    for name in REQUESTS:
+        print(f"  {name:14} {stdio[name] * 1e6:8.0f}us {http[name] * 1e6:8.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# HTTP load test replaying MCP agent sessions against a running or spawned server
+#
+# Usage: python benchmarks/load_test.py --spawn [--target /,/sse,fastmcp] [--concurrency 1,10,50]
+#        python benchmarks/load_test.py --url http://127.0.0.1:8000 --target / --duration 30
+#
+# Each virtual client runs sessions back to back: initialize, tools/list, then
+# --calls rounds of describe_scene, list_joints, describe_robot and rotate_joint.
+# Targets:
+#   /, /sse   JSON-RPC over POST to coppelia_mcp.py
+#   session   coppelia_mcp.py over its SSE transport (GET /sse, then POST to
+#             the announced endpoint; responses arrive on the event stream)
+#   fastmcp   coppelia_fastmcp.py over the same transport
+# With --spawn, each target's server is started on a free port with the simulated
+# backend (--fake-sim), so the numbers are the server's own capacity.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+TOOLS = {
+    # target -> tool names used in a session round
+    "jsonrpc": ("describe_scene", "list_joints", "describe_robot", "rotate_joint"),
+    "fastmcp": ("describe_scene_tool", "list_joints_tool", "describe_robot_tool", "rotate_joint_tool"),
+}
+
+
+def percentile(samples, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = 0
+        self.sessions = 0
+
+    def record(self, op: str, seconds: float, ok: bool):
+        self.latencies.setdefault(op, []).append(seconds)
+        self.errors += not ok
+
+
+class JsonRpcSession:
+    """Plain JSON-RPC over POST (coppelia_mcp.py / and /sse)."""
+
+    names = TOOLS["jsonrpc"]
+
+    sessions = itertools.count(1)
+
+    def __init__(self, http, path):
+        self.http = http
+        self.path = path
+        self.ids = itertools.count(1)
+        # Binds the session to one simulator when the server has several
+        self.headers = {"Mcp-Session-Id": f"load-test-{next(self.sessions)}"}
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def request(self, method, params=None):
+        body = {"jsonrpc": "2.0", "id": next(self.ids), "method": method}
+        if params is not None:
+            body["params"] = params
+        response = await self.http.post(self.path, json=body, headers=self.headers)
+        return response.status_code == 200 and "error" not in response.json()
+
+    async def notify(self, method):
+        pass
+
+
+class SseSession:
+    """MCP over the SSE transport: requests are POSTed, responses read from the stream."""
+
+    def __init__(self, http, names, path="/sse"):
+        self.names = names
+        self.http = http
+        self.path = path
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.endpoint = None
+
+    async def open(self):
+        ready = asyncio.get_running_loop().create_future()
+        self.reader = asyncio.create_task(self._read(ready))
+        self.endpoint = await asyncio.wait_for(ready, 10)
+
+    async def _read(self, ready):
+        async with self.http.stream("GET", self.path) as response:
+            event, data = None, []
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line and data:
+                    payload = "\n".join(data)
+                    if event == "endpoint":
+                        ready.set_result(payload)
+                    elif event == "message":
+                        message = json.loads(payload)
+                        future = self.pending.pop(message.get("id"), None)
+                        if future is not None and not future.done():
+                            future.set_result("error" not in message
+                                              and not message.get("result", {}).get("isError"))
+                    event, data = None, []
+
+    async def close(self):
+        self.reader.cancel()
+        try:
+            await self.reader
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def request(self, method, params=None):
+        rpc_id = next(self.ids)
+        body = {"jsonrpc": "2.0", "id": rpc_id, "method": method, "params": params or {}}
+        future = self.pending[rpc_id] = asyncio.get_running_loop().create_future()
+        response = await self.http.post(self.endpoint, json=body)
+        if response.status_code >= 400:
+            self.pending.pop(rpc_id, None)
+            return False
+        return await asyncio.wait_for(future, 30)
+
+    async def notify(self, method):
+        await self.http.post(self.endpoint, json={"jsonrpc": "2.0", "method": method})
+
+
+async def run_session(make_session, stats: Stats, calls: int, rng: random.Random):
+    session = make_session()
+    await session.open()
+    try:
+        async def timed(op, method, params=None):
+            started = time.perf_counter()
+            try:
+                ok = await session.request(method, params)
+            except Exception:
+                ok = False
+            stats.record(op, time.perf_counter() - started, ok)
+
+        await timed("initialize", "initialize", {
+            "protocolVersion": "2024-11-05", "capabilities": {},
+            "clientInfo": {"name": "load_test", "version": "1.0"}})
+        await session.notify("notifications/initialized")
+        await timed("tools/list", "tools/list")
+        describe_scene, list_joints, describe_robot, rotate = session.names
+        for _ in range(calls):
+            await timed("describe_scene", "tools/call", {"name": describe_scene, "arguments": {}})
+            await timed("list_joints", "tools/call", {"name": list_joints, "arguments": {}})
+            await timed("describe_robot", "tools/call", {"name": describe_robot, "arguments": {}})
+            await timed("rotate_joint", "tools/call", {"name": rotate, "arguments": {
+                "joint_name": "joint1", "angle_deg": rng.uniform(-90, 90)}})
+        stats.sessions += 1
+    finally:
+        await session.close()
+
+
+async def load(base_url: str, target: str, concurrency: int, duration: float, calls: int) -> tuple:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=concurrency * 2 + 10, max_keepalive_connections=concurrency * 2 + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        if target in ("session", "fastmcp"):
+            names = TOOLS["fastmcp" if target == "fastmcp" else "jsonrpc"]
+            make_session = lambda: SseSession(http, names)
+        else:
+            make_session = lambda: JsonRpcSession(http, target)
+        deadline = time.perf_counter() + duration
+
+        async def client(seed):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                try:
+                    await run_session(make_session, stats, calls, rng)
+                except Exception:
+                    stats.errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return stats, elapsed
+
+
+def report(target: str, concurrency: int, stats: Stats, elapsed: float):
+    total = sum(len(v) for v in stats.latencies.values())
+    print(f"\n{target}  concurrency {concurrency}: {total / elapsed:8.1f} req/s, "
+          f"{stats.sessions / elapsed:6.2f} sessions/s, {stats.errors} errors, {elapsed:.1f} s")
+    print(f"  {'operation':16} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for op, samples in stats.latencies.items():
+        print(f"  {op:16} {len(samples):7} {percentile(samples, 50) * 1000:9.2f} "
+              f"{percentile(samples, 95) * 1000:9.2f} {percentile(samples, 99) * 1000:9.2f}")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn(target: str, fake_sim: str, simulators: int):
+    """Start the server for `target` with the simulated backend; return (process, base URL)."""
+    port = free_port()
+    script = "coppelia_fastmcp.py" if target == "fastmcp" else "coppelia_mcp.py"
+    env = dict(os.environ, MCP_FAKE_SIM=fake_sim, MCP_LOG_LEVEL=os.environ.get("MCP_LOG_LEVEL", "WARNING"))
+    if simulators > 1:
+        # Each instance gets its own simulated scene, so the hosts are placeholders
+        env["MCP_SIMULATORS"] = ",".join(f"sim{i}=fake" for i in range(simulators))
+    process = subprocess.Popen([sys.executable, script, "--host", "127.0.0.1", "--port", str(port)],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            if httpx.get(f"{base_url}/cache/stats", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{script} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the MCP endpoints with simulated agent sessions")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL (without --spawn)")
+    parser.add_argument("--target", default="/", help="Comma-separated targets: /, /sse, session, fastmcp")
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma-separated concurrent clients to try")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument("--calls", type=int, default=5, help="Tool rounds per session")
+    parser.add_argument("--spawn", action="store_true", help="Start each target's server with the simulated backend")
+    parser.add_argument("--fake-sim", default="objects=500,robots=2,latency=0.0005",
+                        help="Simulated backend used with --spawn")
+    parser.add_argument("--simulators", type=int, default=1,
+                        help="Simulated instances behind the spawned server (MCP_SIMULATORS)")
+    args = parser.parse_args()
+
+    for target in args.target.split(","):
+        if target not in ("/", "/sse", "session", "fastmcp"):
+            parser.error(f"unknown target {target!r}")
+        process, base_url = spawn(target, args.fake_sim, args.simulators) if args.spawn else (None, args.url)
+        try:
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                stats, elapsed = asyncio.run(load(base_url, target, concurrency, args.duration, args.calls))
+                report(target, concurrency, stats, elapsed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# Server-side scene model cache shared by the describe tools
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+from connection import is_connection_error
+from scene import SceneIndex, fetch_static, fetch_dynamic, probe_scene, resolve_object
+
+TIERS = ("static", "dynamic", "results", "handles")
+
+# Snapshots served to the JSON-RPC batch being answered, see SceneCache.pinned:
+# {SceneCache: (SceneIndex, invalidation count when it was served)}
+_batch_pins = contextvars.ContextVar("scene_cache_batch_pins", default=None)
+
+
+class SceneCache:
+    """Three-tier cache of the simulator scene.
+
+    - static: hierarchy, aliases, types and joint intervals, kept until the scene
+      changes (a scene is loaded or objects are added or removed).
+    - dynamic: object poses and joint positions, kept for one simulation step, or
+      for `dynamic_ttl` seconds when a TTL is configured.
+    - results: tool outputs derived from the two tiers above, dropped whenever
+      either of them is refreshed.
+
+    Alias to handle resolutions ("handles" counters) are kept with the static tier
+    and do not probe. Moves pass `scene_id` to scene.set_joint_targets, which
+    checks it on the simulator in the same round-trip, so a reloaded scene is
+    still noticed and repeated moves of the same joint cost one round-trip each.
+
+    Every lookup costs one cheap probe round-trip (scene key and simulation time),
+    unless the previous probe is younger than `probe_interval` seconds. Mutating
+    tools call invalidate() for the tiers they affect.
+    """
+
+    def __init__(self, dynamic_ttl: float = None, probe_interval: float = None, readers=None):
+        if dynamic_ttl is None:
+            dynamic_ttl = float(os.environ.get("MCP_CACHE_DYNAMIC_TTL", "0"))
+        if probe_interval is None:
+            probe_interval = float(os.environ.get("MCP_CACHE_PROBE_INTERVAL", "0"))
+        self.dynamic_ttl = dynamic_ttl
+        self.probe_interval = probe_interval
+        # Optional readers.ReaderPool, splitting large fetches across connections
+        self.readers = readers
+        self.hits = {tier: 0 for tier in TIERS}
+        self.misses = {tier: 0 for tier in TIERS}
+        self._lock = threading.RLock()
+        self._generation = 0
+        self.invalidate()
+
+    def invalidate(self, tier: str = "static"):
+        """Drop `tier` and every tier derived from it."""
+        with self._lock:
+            self._generation += 1
+            if tier == "static":
+                self._scene_key = None
+                self._static = None
+                self._probed_at = 0.0
+                self._sim_time = None
+                self._handles = {}
+            if tier in ("static", "dynamic"):
+                self._dynamic = None
+                self._dynamic_key = None
+                self._dynamic_at = 0.0
+            self._results = {}
+
+    def _probe(self, sim):
+        now = time.monotonic()
+        if self._scene_key is None or now - self._probed_at >= self.probe_interval:
+            scene_key, sim_time = probe_scene(sim)
+            self._probed_at = now
+            if scene_key != self._scene_key:
+                self.invalidate("static")
+                self._scene_key = scene_key
+                self._probed_at = now
+            self._sim_time = sim_time
+        return self._sim_time
+
+    def index(self, sim) -> SceneIndex:
+        """Return a SceneIndex with up-to-date static and dynamic columns."""
+        with self._lock:
+            pins = _batch_pins.get()
+            if pins is not None:
+                pinned = pins.get(self)
+                if pinned is not None and pinned[1] == self._generation:
+                    self.hits["static"] += 1
+                    self.hits["dynamic"] += 1
+                    return pinned[0]
+            try:
+                self._refresh(sim)
+            except Exception as e:
+                if is_connection_error(e):
+                    raise
+                # E.g. a cached handle that no longer exists: refetch the scene once
+                self.invalidate("static")
+                self._refresh(sim)
+            if pins is not None:
+                pins[self] = (self._dynamic, self._generation)
+            return self._dynamic
+
+    def _refresh(self, sim):
+        # Probe, then fetch the tiers that are missing or out of date
+        with self._lock:
+            sim_time = self._probe(sim)
+            if self._static is None:
+                self.misses["static"] += 1
+                self._static = SceneIndex(fetch_static(sim, self.readers))
+            else:
+                self.hits["static"] += 1
+
+            now = time.monotonic()
+            if self._dynamic is None:
+                fresh = False
+            elif self.dynamic_ttl > 0:
+                fresh = now - self._dynamic_at < self.dynamic_ttl
+            else:
+                fresh = sim_time == self._dynamic_key
+            if not fresh:
+                self.misses["dynamic"] += 1
+                static = self._static.snapshot
+                self._dynamic = self._static.with_dynamic(
+                    fetch_dynamic(sim, static["handles"], static["joint_handles"], self.readers))
+                self._dynamic_key = sim_time
+                self._dynamic_at = now
+                self._results = {}
+            else:
+                self.hits["dynamic"] += 1
+
+    def static_index(self, sim, max_age: float = None) -> SceneIndex:
+        """Return the cached static tier, probing only when it has to be fetched.
+
+        With `max_age`, also probes when the last probe is older than that many
+        seconds, so a scene reload is noticed by callers that never use index().
+        """
+        with self._lock:
+            if max_age is not None and self._static is not None and time.monotonic() - self._probed_at >= max_age:
+                self._probe(sim)
+            if self._static is None:
+                self._probe(sim)
+                self.misses["static"] += 1
+                self._static = SceneIndex(fetch_static(sim, self.readers))
+            else:
+                self.hits["static"] += 1
+            return self._static
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """Within the block, serve the first snapshot read again without probing.
+
+        Used around JSON-RPC batches so their read-only calls share one snapshot.
+        The pin belongs to the block's context (and the tasks and simulator calls
+        started from it); other callers probe as usual. invalidate() still
+        applies, so reads after a mutating call see fresh state.
+        """
+        if _batch_pins.get() is not None:
+            # Already pinned by an enclosing block (e.g. CacheGroup.pinned)
+            yield
+            return
+        token = _batch_pins.set({})
+        try:
+            yield
+        finally:
+            _batch_pins.reset(token)
+
+    def result(self, sim, name: str, build):
+        """Return the cached output of build(index) for tool `name`.
+
+        The returned object is shared between callers and must not be modified.
+        """
+        with self._lock:
+            index = self.index(sim)
+            if index is not self._dynamic:
+                # An older snapshot pinned by a batch: _results belong to a newer one
+                return build(index)
+            if name in self._results:
+                self.hits["results"] += 1
+            else:
+                self.misses["results"] += 1
+                self._results[name] = build(index)
+            return self._results[name]
+
+    @property
+    def scene_id(self):
+        """Unique id of the scene the cached handles belong to (None before the first probe)."""
+        return self._scene_key[0] if self._scene_key is not None else None
+
+    def resolve(self, sim, name: str) -> int:
+        """Return the handle for an alias or object path, resolving it once per scene."""
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is not None:
+                self.hits["handles"] += 1
+                return handle
+            self.misses["handles"] += 1
+            if self._scene_key is None:
+                # Records the scene the handle belongs to, see scene_id
+                self._probe(sim)
+            handle = resolve_object(sim, name, self._static)
+            self._handles[name] = handle
+            return handle
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {tier: {"hits": self.hits[tier], "misses": self.misses[tier]} for tier in TIERS}
@@ -0,0 +1,253 @@
+# Lazy, self-healing connection to CoppeliaSim's ZMQ remote API
+
+import contextlib
+import os
+import random
+import sys
+import threading
+import time
+
+from logs import log
+
+
+class SimUnavailableError(Exception):
+    """Raised when the simulator cannot be reached within the wait budget."""
+
+
+def _connection_errors():
+    errors = (ConnectionError, TimeoutError)
+    # zmq is imported with the first remote client; until then no ZMQError can occur
+    zmq = sys.modules.get("zmq")
+    if zmq is not None:
+        errors += (zmq.ZMQError,)
+    return errors
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """True if exc, or an exception it was raised from, means the socket is unusable."""
+    errors = _connection_errors()
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, errors):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def open_remote(host: str, port: int = 23000, connect_timeout: float = None, call_timeout: float = None):
+    """Connect a RemoteAPIClient and return (client, sim).
+
+    The first call must answer within MCP_SIM_CONNECT_TIMEOUT seconds (default 2),
+    later calls within MCP_SIM_CALL_TIMEOUT (default 30) instead of hanging. A REQ
+    socket cannot be reused after a timed-out call; SimConnection replaces the
+    whole client when that happens.
+    """
+    import zmq
+    from coppeliasim_zmqremoteapi_client import RemoteAPIClient
+
+    if connect_timeout is None:
+        connect_timeout = float(os.environ.get("MCP_SIM_CONNECT_TIMEOUT", "2"))
+    if call_timeout is None:
+        call_timeout = float(os.environ.get("MCP_SIM_CALL_TIMEOUT", "30"))
+    client = RemoteAPIClient(host, port)
+    client.socket.setsockopt(zmq.LINGER, 0)
+    client.socket.setsockopt(zmq.RCVTIMEO, int(connect_timeout * 1000))
+    try:
+        sim = client.getObject('sim')
+    except Exception:
+        close_client(client)
+        raise
+    client.socket.setsockopt(zmq.RCVTIMEO, int(call_timeout * 1000))
+    return client, sim
+
+
+def close_client(client):
+    socket = getattr(client, "socket", None)
+    if socket is not None:
+        try:
+            socket.close(linger=0)
+        except Exception:
+            pass
+
+
+class SimConnection:
+    """Owns the client/sim pair, reconnecting and health-checking it in the background.
+
+    - Lazy: nothing connects until the first session() (or start()).
+    - Reconnects with exponential backoff (MCP_RECONNECT_BACKOFF doubling up to
+      MCP_RECONNECT_BACKOFF_MAX seconds, with jitter) whenever the connection fails
+      or a call hits a connection error.
+    - Probes liveness every MCP_LIVENESS_INTERVAL seconds when no call succeeded
+      in that time.
+    - Callers wait up to MCP_RECONNECT_WAIT seconds for a reconnect. After
+      MCP_CIRCUIT_THRESHOLD consecutive failed attempts the circuit opens and
+      callers fail at once with SimUnavailableError until an attempt succeeds.
+
+    `factory()` returns a new (client, sim) pair or raises. The lock serializes
+    all use of the socket, including probes from the supervisor thread.
+    """
+
+    def __init__(self, factory, wait: float = None, liveness_interval: float = None,
+                 failure_threshold: int = None, backoff: float = None, backoff_max: float = None):
+        env = os.environ.get
+        self.factory = factory
+        self.wait = wait if wait is not None else float(env("MCP_RECONNECT_WAIT", "5"))
+        self.liveness_interval = (liveness_interval if liveness_interval is not None
+                                  else float(env("MCP_LIVENESS_INTERVAL", "5")))
+        self.failure_threshold = (failure_threshold if failure_threshold is not None
+                                  else int(env("MCP_CIRCUIT_THRESHOLD", "3")))
+        self.backoff = backoff if backoff is not None else float(env("MCP_RECONNECT_BACKOFF", "0.5"))
+        self.backoff_max = backoff_max if backoff_max is not None else float(env("MCP_RECONNECT_BACKOFF_MAX", "30"))
+        self.client = None
+        self.sim = None
+        self.failures = 0
+        self.last_error = None
+        self.connects = 0
+        self.next_attempt = 0.0
+        self.lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._wake = threading.Event()
+        self._last_ok = 0.0
+        self._supervisor = None
+        self._stopped = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    @property
+    def circuit_open(self) -> bool:
+        return not self.connected and self.failures >= self.failure_threshold
+
+    def start(self):
+        """Start the supervisor thread (connects in the background)."""
+        with self._start_lock:
+            if self._supervisor is None or not self._supervisor.is_alive():
+                self._stopped = False
+                self._supervisor = threading.Thread(target=self._supervise, name="coppelia-connection",
+                                                    daemon=True)
+                self._supervisor.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        with self.lock:
+            self._drop()
+
+    def use(self, client, sim):
+        """Install an already connected pair (e.g. a fake_sim.FakeClient)."""
+        with self.lock:
+            self._drop()
+            self.client, self.sim = client, sim
+            self.failures = 0
+            self._last_ok = time.monotonic()
+            self._connected.set()
+
+    def get(self, wait: float = None):
+        """Return (client, sim), waiting up to `wait` seconds for a (re)connect."""
+        if self.connected:
+            return self.client, self.sim
+        self.start()
+        if self.circuit_open:
+            retry = max(0.0, self.next_attempt - time.monotonic())
+            raise SimUnavailableError(f"CoppeliaSim unavailable (circuit open, retrying in {retry:.1f}s): "
+                                      f"{self.last_error}")
+        self._wake.set()
+        if not self._connected.wait(self.wait if wait is None else wait):
+            raise SimUnavailableError(f"CoppeliaSim not connected: {self.last_error or 'connecting'}")
+        return self.client, self.sim
+
+    @contextlib.contextmanager
+    def session(self, wait: float = None):
+        """Hold the connection for a block of sim calls; yields (client, sim).
+
+        A connection error inside the block drops the connection, so the next
+        caller waits for a fresh one instead of reusing a broken socket.
+        """
+        while True:
+            # Wait without the lock, so the supervisor can install the new connection
+            client, sim = self.get(wait)
+            self.lock.acquire()
+            if self.connected and self.sim is sim:
+                break
+            self.lock.release()
+        try:
+            yield client, sim
+        except Exception as e:
+            if is_connection_error(e):
+                self._fail(e)
+                raise SimUnavailableError(f"Lost connection to CoppeliaSim: {str(e)}") from e
+            raise
+        else:
+            self._last_ok = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def status(self) -> dict:
+        return {
+            "connected": self.connected,
+            "circuit_open": self.circuit_open,
+            "consecutive_failures": self.failures,
+            "connects": self.connects,
+            "last_error": self.last_error,
+        }
+
+    def _drop(self):
+        self._connected.clear()
+        if self.client is not None:
+            close_client(self.client)
+        self.client = self.sim = None
+
+    def _fail(self, error):
+        with self.lock:
+            if self.connected:
+                log.warning(f"⚠️ Connection to CoppeliaSim lost: {str(error)}")
+            self.last_error = str(error)
+            self._drop()
+        self._wake.set()
+
+    def _supervise(self):
+        while not self._stopped:
+            if not self.connected:
+                self._attempt()
+                if not self.connected:
+                    delay = min(self.backoff_max, self.backoff * 2 ** max(0, self.failures - 1))
+                    delay *= random.uniform(0.8, 1.2)
+                    self.next_attempt = time.monotonic() + delay
+                    self._wake.wait(delay)
+                    self._wake.clear()
+                continue
+            self._wake.wait(self.liveness_interval)
+            self._wake.clear()
+            if self.connected and time.monotonic() - self._last_ok >= self.liveness_interval:
+                self._probe()
+
+    def _attempt(self):
+        try:
+            client, sim = self.factory()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            log.warning(f"⚠️ Could not connect to CoppeliaSim (attempt {self.failures}): {str(e)}")
+            return
+        with self.lock:
+            self.client, self.sim = client, sim
+            self.failures = 0
+            self.last_error = None
+            self.connects += 1
+            self._last_ok = time.monotonic()
+            self._connected.set()
+        log.info("✅ Connected to CoppeliaSim")
+
+    def _probe(self):
+        # Waits for any call in progress; a dead simulator fails after the call timeout
+        with self.lock:
+            if not self.connected:
+                return
+            try:
+                self.sim.getSimulationTime()
+                self._last_ok = time.monotonic()
+            except Exception as e:
+                self._fail(e)
@@ -1,59 +1,76 @@
+import startup  # First, so --profile-imports times every import below
 from fastmcp.server import FastMCP
-from coppeliasim_zmqremoteapi_client import RemoteAPIClient
+from fastmcp import Context
+import contextlib
 import math
 import logging
-from tools import rotate_joint, list_joints, describe_robot, describe_scene
+from tools import rotate_joint, set_joint_positions, execute_trajectory, list_joints, describe_robot, describe_scene
+from metrics import Metrics
+from tracing import TracedSim, trace
+from pool import SimPool, connect_instance, parse_simulators
+import os
+from formatters import format_robots
 from fastmcp.server.http import create_sse_app
 import argparse
 from prompts import list_prompts_metadata, get_prompt_by_name
-from fastapi import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Mount
 
 server = FastMCP()
 
 print("🚀 Starting MCP server (fastmcp)...")
 
-client = None
-sim = None
+coppelia_host = "127.0.0.1"
 
-def connect_to_coppeliasim(host="127.0.0.1"):
-    global client, sim
-    print(f"Attempting to connect to CoppeliaSim at {host}:23000")
-    try:
-        client = RemoteAPIClient(host, 23000)
-        sim = client.getObject('sim')
-        print(f"✅ Connected to CoppeliaSim at {host}:23000")
-    except Exception as e:
-        print(f"⚠️ Could not connect to CoppeliaSim at {host}:23000")
-        print(f"Error details: {str(e)}")
-        sim = None
+def open_sim(instance, reader=False):
+    # Called by an instance's connection supervisor for every (re)connect, and
+    # by its reader pool for each extra connection; readers use the same host
+    return connect_instance(instance, reader, coppelia_host, metrics, say=print)
 
-# Call at import time for default host
-connect_to_coppeliasim()
+# Simulator instances (MCP_SIMULATORS); each connects in the background once the
+# server starts (or on first use with MCP_CONNECT_ON_START=0), see connection.py
+sim_pool = SimPool(open_sim)
+metrics = Metrics(sim_pool.caches)
+
+@contextlib.contextmanager
+def tool_session(name, simulator, ctx):
+    # Yields (client, sim, cache) of the chosen simulator, measured and traced as one tool call;
+    # without an explicit simulator, the client's FastMCP session stays on one instance
+    instance = sim_pool.pick(simulator, ctx.session_id)
+    with instance.connection.session() as (client, sim), \
+            metrics.tool(name, instance.traffic, instance.cache), trace(sim, name):
+        yield client, sim, instance.cache
+
+@server.tool()
+def rotate_joint_tool(joint_name: str, angle_deg: float, simulator: str = None, ctx: Context = None):
+    with tool_session("rotate_joint", simulator, ctx) as (client, sim, cache):
+        return rotate_joint(sim, joint_name, angle_deg, cache=cache)
+
+@server.tool()
+def set_joint_positions_tool(joints: dict = None, joint_names: list = None, angles_deg: list = None,
+                             simulator: str = None, ctx: Context = None):
+    with tool_session("set_joint_positions", simulator, ctx) as (client, sim, cache):
+        return set_joint_positions(sim, joints=joints, joint_names=joint_names, angles_deg=angles_deg, cache=cache)
 
 @server.tool()
-def rotate_joint_tool(joint_name: str, angle_deg: float):
-    if sim is None:
-        raise Exception("CoppeliaSim not connected (sim is None)")
-    return rotate_joint(sim, joint_name, angle_deg)
+def execute_trajectory_tool(joint_names: list, waypoints: list, steps_per_waypoint: int = 1, simulator: str = None, ctx: Context = None):
+    with tool_session("execute_trajectory", simulator, ctx) as (client, sim, cache):
+        return execute_trajectory(sim, joint_names, waypoints, steps_per_waypoint=steps_per_waypoint, client=client, cache=cache)
 
 @server.tool()
-def describe_robot_tool():
-    if sim is None:
-        raise Exception("CoppeliaSim not connected (sim is None)")
-    return describe_robot(sim)
+def describe_robot_tool(simulator: str = None, ctx: Context = None):
+    with tool_session("describe_robot", simulator, ctx) as (client, sim, cache):
+        return format_robots(describe_robot(sim, cache=cache))
 
 @server.tool()
-def list_joints_tool():
-    if sim is None:
-        raise Exception("CoppeliaSim not connected (sim is None)")
-    return list_joints(sim)
+def list_joints_tool(simulator: str = None, ctx: Context = None):
+    with tool_session("list_joints", simulator, ctx) as (client, sim, cache):
+        return list_joints(sim, cache=cache)
 
 @server.tool()
-def describe_scene_tool():
-    if sim is None:
-        raise Exception("CoppeliaSim not connected (sim is None)")
-    return describe_scene(sim)
+def describe_scene_tool(simulator: str = None, ctx: Context = None):
+    with tool_session("describe_scene", simulator, ctx) as (client, sim, cache):
+        return describe_scene(sim, cache=cache)
 
 app = create_sse_app(server, message_path="/", sse_path="/sse")
 
@@ -72,19 +89,58 @@ async def prompts_get(request):
         "messages": prompt["messages"]
     })
 
+async def cache_stats(request):
+    return JSONResponse(sim_pool.caches.stats())
+
+async def trace_stats(request):
+    return JSONResponse({instance.name: sim.stats() for instance in sim_pool
+                         if isinstance(sim := instance.connection.sim, TracedSim)})
+
+async def simulators_status(request):
+    return JSONResponse(sim_pool.status())
+
+async def healthz(request):
+    # Readiness: 503 until a simulator is connected
+    health = sim_pool.health()
+    health["startup_ms"] = round(startup.ready_seconds * 1000) if startup.ready_seconds is not None else None
+    return JSONResponse(health, status_code=200 if health["ready"] else 503)
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.add_route("/prompts/list", prompts_list, methods=["GET", "POST"])
 app.add_route("/prompts/get", prompts_get, methods=["POST"])
+app.add_route("/cache/stats", cache_stats, methods=["GET"])
+app.add_route("/trace/stats", trace_stats, methods=["GET"])
+app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+app.add_route("/simulators", simulators_status, methods=["GET"])
+app.add_route("/healthz", healthz, methods=["GET"])
+# The message endpoint is mounted at "/" and would shadow the routes above: keep it last
+app.router.routes.sort(key=lambda route: isinstance(route, Mount))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="CoppeliaSim FastMCP Server")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Host to bind the server to")
     parser.add_argument("--port", type=int, default=8000, help="Port to bind the server to")
     parser.add_argument("--coppeliaHost", type=str, default="127.0.0.1", help="Host for CoppeliaSim ZeroMQ remote API")
+    parser.add_argument("--simulators", type=str, default=None, metavar="LIST",
+                        help="Simulator instances, e.g. cell1=10.0.0.5:23000,cell2=10.0.0.6:23000")
+    parser.add_argument("--fake-sim", type=str, default=None, metavar="SPEC",
+                        help="Use the simulated backend, e.g. objects=1000,robots=4,latency=0.001")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Print the slowest imports once the server is ready (same as MCP_IMPORT_PROFILE=1)")
     args = parser.parse_args()
+    if args.fake_sim:
+        os.environ["MCP_FAKE_SIM"] = args.fake_sim
 
-    # Connect to CoppeliaSim with the specified host
-    connect_to_coppeliasim(args.coppeliaHost)
+    # Used by the first (lazy) connect and every reconnect
+    coppelia_host = args.coppeliaHost
+    if args.simulators:
+        sim_pool.configure(parse_simulators(args.simulators))
 
     import uvicorn
-    uvicorn.run(app, host=args.host, port=args.port)
+    print(startup.mark_ready())
+    if os.environ.get("MCP_CONNECT_ON_START", "1") != "0":
+        sim_pool.start()  # Connects in the background while uvicorn binds its socket
+    uvicorn.run(app, host=args.host, port=args.port, ws="none")  # No websocket routes
 
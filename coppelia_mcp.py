@@ -1,22 +1,83 @@
-from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
-from sse_starlette.sse import EventSourceResponse
-from coppeliasim_zmqremoteapi_client import RemoteAPIClient
+import startup  # First, so --profile-imports times every import below
 import asyncio
+from jsonfast import dumps, loads
 import math
-from tools import rotate_joint, list_joints, describe_robot, describe_scene
+from tools import rotate_joint, set_joint_positions, execute_trajectory, list_joints, describe_robot, describe_scene
+from dispatcher import Dispatcher, JsonRpcError, progress_token
+from pool import SimPool, SIMULATOR_PROPERTY, connect_instance, current_session, parse_simulators
+from formatters import OUTPUT_PROPERTIES, render_result, format_robots, format_scene, format_joints
+from metrics import Metrics
+from tracing import TracedSim, trace
+from telemetry import TelemetryHub, TelemetryLagError, sample_state
 import logging
 from prompts import list_prompts_metadata, get_prompt_by_name
+from logs import setup_logging, Payload, elapsed_ms
+from sessions import SessionRegistry, SessionLimitError
 import argparse
 import os
-
-app = FastAPI()
-
-print("🚀 Starting MCP server...")
-
-# Global variables
-client = None
-sim = None
+import sys
+import time
+import uuid
+
+log = setup_logging()
+
+log.info("🚀 Starting MCP server...")
+
+
+# Open GET /sse streams, each with its own bounded event queue, see sessions.py
+sse_sessions = SessionRegistry()
+
+def open_sim(instance, reader=False):
+    # Called by an instance's connection supervisor for every (re)connect, and
+    # by its reader pool for each extra connection
+    return connect_instance(instance, reader, os.environ.get("COPPELIASIM_HOST", "127.0.0.1"), metrics)
+
+# Simulator instances (MCP_SIMULATORS), each with its own connection, worker
+# thread and scene cache. Instances connect on first use, see connection.py
+sim_pool = SimPool(open_sim)
+# Per-tool and per-method timings, ZMQ traffic and cache hits, served at /metrics
+metrics = Metrics(sim_pool.caches)
+
+def start_simulators():
+    # Once the server is up: connect in the background rather than on the first
+    # tool call, unless MCP_CONNECT_ON_START=0
+    log.info(startup.mark_ready())
+    if os.environ.get("MCP_CONNECT_ON_START", "1") != "0":
+        sim_pool.start()
+
+def sample_telemetry(instance, kinds):
+    # Fail fast while disconnected, the sampler simply retries on its next tick
+    with instance.connection.session(wait=0) as (client, sim):
+        return sample_state(sim, instance.cache, kinds)
+
+# One shared sampler per simulator for all telemetry subscribers of GET /sse
+telemetry_hubs = {}
+
+def telemetry_hub_for(instance):
+    hub = telemetry_hubs.get(instance.name)
+    if hub is None:
+        hub = telemetry_hubs[instance.name] = TelemetryHub(
+            lambda kinds: sample_telemetry(instance, kinds), instance.executor.run)
+    return hub
+
+def trajectory_progress_publisher():
+    # Progress goes only to the SSE session that made the call, as MCP
+    # notifications/progress on its message channel, and only if the client
+    # asked for it with params._meta.progressToken
+    token = progress_token.get()
+    session = sse_sessions.get(current_session.get())
+    if token is None or session is None:
+        return None
+    loop = asyncio.get_running_loop()
+
+    def publish(progress):
+        # Called from the simulator thread; hand the event over to the event loop
+        notification = {"jsonrpc": "2.0", "method": "notifications/progress", "params": {
+            "progressToken": token, "progress": progress["step"], "total": progress["total"],
+            "message": f"Simulation time {progress['sim_time']:.3f} s"}}
+        # Slow client: the event is dropped rather than buffered without bound
+        loop.call_soon_threadsafe(session.offer, {"event": "message", "data": dumps(notification)})
+    return publish
 
 # Define resources and prompts
 resources = [
@@ -29,602 +90,495 @@ resources = [
     }
 ]
 
-@app.on_event("startup")
-def connect_to_coppeliasim():
-    global client, sim
-    coppelia_host = os.environ.get("COPPELIASIM_HOST", "127.0.0.1")
-    print(f"Attempting to connect to CoppeliaSim at {coppelia_host}:23000")
-    try:
-        client = RemoteAPIClient(coppelia_host, 23000)
-        print("RemoteAPIClient created, attempting to get 'sim' object...")
-        sim = client.getObject('sim')
-        print(f"✅ Connected to CoppeliaSim at {coppelia_host}:23000")
-    except Exception as e:
-        print(f"⚠️ Could not connect to CoppeliaSim at {coppelia_host}:23000")
-        print(f"Error details: {str(e)}")
-        sim = None
-
-# SSE endpoint
-@app.api_route("/sse", methods=["GET", "POST"])
-async def sse(request: Request):
-    if request.method == "POST":
-        try:
-            body = await request.json()
-            print("📦 JSON-RPC via POST /sse:", body)
-
-            method = body.get("method")
-            rpc_id = body.get("id")
-            params = body.get("params", {})
-
-            if method == "initialize":
-                return {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "result": {
-                        "protocolVersion": "2024-11-05",
-                        "capabilities": {"tools": {}},
-                        "serverInfo": {
-                            "name": "CoppeliaSim MCP",
-                            "version": "1.0"
-                        }
-                    }
-                }
-
-            elif method == "tools/list":
-                return {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "result": {
-                        "tools": [
-                            {
-                                "name": "rotate_joint",
-                                "description": "Rotates a joint to a given angle.",
-                                "inputSchema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "joint_name": {"type": "string"},
-                                        "angle_deg": {"type": "number"}
-                                    },
-                                    "required": ["joint_name", "angle_deg"]
-                                }
-                            },
-                            {
-                                "name": "describe_robot",
-                                "description": "Describes the robot's joints and their details.",
-                                "inputSchema": {
-                                    "type": "object",
-                                    "properties": {}
-                                },
-                                "resultSchema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "joint_count": {"type": "number"},
-                                        "joints": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "name": {"type": "string"},
-                                                    "type": {"type": "string"},
-                                                    "limits": {"type": "array", "items": {"type": "number"}}
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            },
-                            {
-                                "name": "describe_scene",
-                                "description": "Describes the scene objects (excluding robot joints).",
-                                "inputSchema": {
-                                    "type": "object",
-                                    "properties": {}
-                                },
-                                "resultSchema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "objects": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "name": {"type": "string"},
-                                                    "type": {"type": "string"},
-                                                    "position": {"type": "array", "items": {"type": "number"}},
-                                                    "orientation": {"type": "array", "items": {"type": "number"}}
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            },
-                            {
-                                "name": "list_joints",
-                                "description": "Lists all joints with their types and limits.",
-                                "inputSchema": {
-                                    "type": "object",
-                                    "properties": {}
-                                },
-                                "resultSchema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "joints": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "id": {"type": "number"},
-                                                    "alias": {"type": "string"},
-                                                    "position": {"type": "array", "items": {"type": "number"}},
-                                                    "type": {"type": "string"},
-                                                    "limits_deg": {
-                                                        "type": "array",
-                                                        "items": {"type": "number"}
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                }
-
-            elif method == "tools/call":
-                tool_name = params.get("name")
-                arguments = params.get("arguments", {})
-
-                try:
-                    if sim is None:
-                        raise Exception("CoppeliaSim not connected (sim is None)")
-                    if tool_name == "rotate_joint":
-                        joint_name = arguments.get("joint_name")
-                        angle_deg = arguments.get("angle_deg")
-                        result = rotate_joint(sim, joint_name, angle_deg)
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": rpc_id,
-                            "result": {
-                                "content": [
-                                    {"type": "text", "text": result}
-                                ]
-                            }
-                        }
-                    elif tool_name == "describe_robot":
-                        text = describe_robot(sim)
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": rpc_id,
-                            "result": {
-                                "content": [
-                                    {"type": "text", "text": text}
-                                ]
-                            }
-                        }
-                    elif tool_name == "describe_scene":
-                        objects = describe_scene(sim)
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": rpc_id,
-                            "result": {
-                                "content": [
-                                    {"type": "text", "text": (
-                                        "Objects:\n" +
-                                        "\n".join(
-                                            f"{o.get('name', '')} (type: {o.get('type', '')}, pos: {o.get('position', '')}, orient: {o.get('orientation', '')})"
-                                            for o in objects
-                                        )
-                                    )}
-                                ]
-                            }
-                        }
-                    elif tool_name == "list_joints":
-                        joints = list_joints(sim)
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": rpc_id,
-                            "result": {
-                                "content": [
-                                    {"type": "text", "text": "\n".join(
-                                        f"{j['alias']} (id: {j['id']}), pos: {j['position']}, type: {j['type']}, limits: {j['limits_deg']}"
-                                        for j in joints
-                                    )}
-                                ]
-                            }
-                        }
-                    else:
-                        return {
-                            "jsonrpc": "2.0",
-                            "id": rpc_id,
-                            "error": {
-                                "code": -32601,
-                                "message": f"Tool '{tool_name}' not found"
-                            }
-                        }
-                except Exception as e:
-                    logging.exception(f"Error in tool '{tool_name}': {str(e)}")
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "error": {
-                            "code": -32603,
-                            "message": f"Internal error in tool '{tool_name}': {str(e)}"
-                        }
-                    }
+# JSON-RPC methods and tools, shared by POST / and POST /sse
+dispatcher = Dispatcher(batch_scope=sim_pool.caches.pinned, metrics=metrics)
 
-            elif method == "resources/list":
-                return {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "result": {
-                        "resources": resources
-                    }
-                }
-
-            elif method == "prompts/list":
-                return {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "result": {
-                        "prompts": list_prompts_metadata()
-                    }
-                }
-            elif method == "prompts/get":
-                prompt_name = params.get("name")
-                arguments = params.get("arguments", {})
-                prompt = get_prompt_by_name(prompt_name, arguments)
-                if prompt is None:
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "error": {
-                            "code": -32602,
-                            "message": f"Prompt '{prompt_name}' not found"
-                        }
-                    }
-                return {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "result": {
-                        "description": prompt.get("description", ""),
-                        "messages": prompt["messages"]
-                    }
-                }
-
-            return {
-                "jsonrpc": "2.0",
-                "id": rpc_id,
-                "error": {
-                    "code": -32601,
-                    "message": f"Unknown method: {method}"
-                }
-            }
-
-        except Exception as e:
-            return {
-                "jsonrpc": "2.0",
-                "id": None,
-                "error": {
-                    "code": -32603,
-                    "message": f"Exception: {str(e)}"
-                }
-            }
-
-    async def event_generator():
-        while True:
-            if await request.is_disconnected():
-                break
-            yield {
-                "event": "ping",
-                "data": "heartbeat"
-            }
-            await asyncio.sleep(10)
-
-    return EventSourceResponse(event_generator())
-
-@app.post("/")
-async def jsonrpc_handler(request: Request):
-    print("📥 Received POST / request")
+dispatcher.static_method("initialize", {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {"tools": {}},
+    "serverInfo": {
+        "name": "CoppeliaSim MCP",
+        "version": "1.0"
+    }
+})
+dispatcher.static_method("resources/list", {"resources": resources})
+dispatcher.static_method("prompts/list", {"prompts": list_prompts_metadata()})
+
+@dispatcher.method("prompts/get")
+async def get_prompt(params, rpc_id):
+    prompt_name = params.get("name")
+    prompt = get_prompt_by_name(prompt_name, params.get("arguments", {}))
+    if prompt is None:
+        raise JsonRpcError(-32602, f"Prompt '{prompt_name}' not found")
+    return {
+        "description": prompt.get("description", ""),
+        "messages": prompt["messages"]
+    }
 
-    try:
-        body = await request.json()
-        print("📦 Request JSON:", body)
-
-        method = body.get("method")
-        rpc_id = body.get("id")
-        params = body.get("params", {})
-
-        print(f"🔧 Handling method: {method} (id: {rpc_id})")
-
-        if method == "initialize":
-            response = {
-                "jsonrpc": "2.0",
-                "id": rpc_id,
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {"tools": {}},
-                    "serverInfo": {
-                        "name": "CoppeliaSim MCP",
-                        "version": "1.0"
-                    }
-                }
-            }
-            print("📤 Responding with:", response)
-            return response
-
-        elif method == "tools/list":
-            response = {
-                "jsonrpc": "2.0",
-                "id": rpc_id,
-                "result": {
-                    "tools": [
-                        {
-                            "name": "rotate_joint",
-                            "description": "Rotates a joint to a given angle.",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "joint_name": {"type": "string"},
-                                    "angle_deg": {"type": "number"}
-                                },
-                                "required": ["joint_name", "angle_deg"]
-                            }
-                        },
-                        {
-                            "name": "describe_robot",
-                            "description": "Describes the robot's joints and their details.",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {}
-                            },
-                            "resultSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "joint_count": {"type": "number"},
-                                    "joints": {
-                                        "type": "array",
-                                        "items": {
-                                            "type": "object",
-                                            "properties": {
-                                                "name": {"type": "string"},
-                                                "type": {"type": "string"},
-                                                "limits": {"type": "array", "items": {"type": "number"}}
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        },
-                        {
-                            "name": "describe_scene",
-                            "description": "Describes the scene objects (excluding robot joints).",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {}
-                            },
-                            "resultSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "objects": {
-                                        "type": "array",
-                                        "items": {
-                                            "type": "object",
-                                            "properties": {
-                                                "name": {"type": "string"},
-                                                "type": {"type": "string"},
-                                                "position": {"type": "array", "items": {"type": "number"}},
-                                                "orientation": {"type": "array", "items": {"type": "number"}}
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        },
-                        {
-                            "name": "list_joints",
-                            "description": "Lists all joints with their types and limits.",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {}
-                            },
-                            "resultSchema": {
+async def run_tool(arguments, func, *args, **kwargs):
+    instance = sim_pool.pick(arguments.get("simulator"), current_session.get())
+    if not instance.connection.connected:
+        # Wait for a reconnect here rather than on the simulator thread, so calls queued there are not held up
+        await asyncio.get_running_loop().run_in_executor(None, instance.connection.get)
+    return await instance.executor.run(invoke_tool, instance, func, *args, cache=instance.cache, **kwargs)
+
+def invoke_tool(instance, func, *args, with_client=False, **kwargs):
+    # Runs on the instance's simulator thread, measured and (with MCP_TRACE_DIR) traced as one tool call
+    with instance.connection.session() as (client, sim), \
+            metrics.tool(func.__name__, instance.traffic, instance.cache), trace(sim, func.__name__):
+        if with_client:
+            kwargs["client"] = client
+        return func(sim, *args, **kwargs)
+
+@dispatcher.tool({
+    "name": "rotate_joint",
+    "description": "Rotates a joint to a given angle.",
+    "annotations": {"readOnlyHint": False},
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "joint_name": {"type": "string"},
+            "angle_deg": {"type": "number"},
+            **SIMULATOR_PROPERTY
+        },
+        "required": ["joint_name", "angle_deg"]
+    }
+})
+async def call_rotate_joint(arguments, rpc_id):
+    return await run_tool(arguments, rotate_joint, arguments.get("joint_name"), arguments.get("angle_deg"))
+
+@dispatcher.tool({
+    "name": "set_joint_positions",
+    "description": "Moves several joints at once, in a single simulator call. Angles are checked against the joint limits.",
+    "annotations": {"readOnlyHint": False},
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "joints": {
+                "type": "object",
+                "description": "Mapping of joint name or path to target angle in degrees.",
+                "additionalProperties": {"type": "number"}
+            },
+            "joint_names": {"type": "array", "items": {"type": ["string", "integer"]}},
+            "angles_deg": {"type": "array", "items": {"type": "number"}},
+            **SIMULATOR_PROPERTY
+        }
+    }
+})
+async def call_set_joint_positions(arguments, rpc_id):
+    return await run_tool(
+        arguments,
+        set_joint_positions,
+        joints=arguments.get("joints"),
+        joint_names=arguments.get("joint_names"),
+        angles_deg=arguments.get("angles_deg")
+    )
+
+@dispatcher.tool({
+    "name": "execute_trajectory",
+    "description": "Executes dense joint waypoints in synchronous stepping mode, one simulation step per waypoint. On a GET /sse session, a call with params._meta.progressToken gets notifications/progress messages on that session.",
+    "annotations": {"readOnlyHint": False},
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "joint_names": {"type": "array", "items": {"type": ["string", "integer"]}},
+            "waypoints": {
+                "type": "array",
+                "description": "Rows of target angles in degrees (time x joints).",
+                "items": {"type": "array", "items": {"type": "number"}}
+            },
+            "steps_per_waypoint": {"type": "integer", "minimum": 1},
+            **SIMULATOR_PROPERTY
+        },
+        "required": ["joint_names", "waypoints"]
+    }
+})
+async def call_execute_trajectory(arguments, rpc_id):
+    return await run_tool(
+        arguments,
+        execute_trajectory,
+        arguments.get("joint_names"),
+        arguments.get("waypoints"),
+        steps_per_waypoint=arguments.get("steps_per_waypoint", 1),
+        with_client=True,
+        progress=trajectory_progress_publisher()
+    )
+
+@dispatcher.tool({
+    "name": "describe_robot",
+    "description": "Describes the robot's joints and their details.",
+    "annotations": {"readOnlyHint": True},
+    "inputSchema": {
+        "type": "object",
+        "properties": {**OUTPUT_PROPERTIES, **SIMULATOR_PROPERTY}
+    },
+    "resultSchema": {
+        "type": "object",
+        "properties": {
+            "robots": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "base_handle": {"type": "integer"},
+                        "base_name": {"type": "string"},
+                        "elements": {
+                            "type": "array",
+                            "items": {
                                 "type": "object",
                                 "properties": {
-                                    "joints": {
-                                        "type": "array",
-                                        "items": {
-                                            "type": "object",
-                                            "properties": {
-                                                "id": {"type": "number"},
-                                                "alias": {"type": "string"},
-                                                "position": {"type": "array", "items": {"type": "number"}},
-                                                "type": {"type": "string"},
-                                                "limits_deg": {
-                                                    "type": "array",
-                                                    "items": {"type": "number"}
-                                                }
-                                            }
-                                        }
-                                    }
+                                    "handle": {"type": "integer"},
+                                    "name": {"type": "string"},
+                                    "type": {"type": "integer", "description": "CoppeliaSim object type code"},
+                                    "position": {"type": "array", "items": {"type": "number"}},
+                                    "orientation": {"type": "array", "items": {"type": "number"}}
                                 }
                             }
                         }
-                    ]
-                }
-            }
-            print("📤 Responding with:", response)
-            return response
-
-        elif method == "tools/call":
-            tool_name = params.get("name")
-            arguments = params.get("arguments", {})
-
-            try:
-                if sim is None:
-                    raise Exception("CoppeliaSim not connected (sim is None)")
-                if tool_name == "rotate_joint":
-                    joint_name = arguments.get("joint_name")
-                    angle_deg = arguments.get("angle_deg")
-                    result = rotate_joint(sim, joint_name, angle_deg)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "result": {
-                            "content": [
-                                {"type": "text", "text": result}
-                            ]
-                        }
-                    }
-                    print("📤 Responding with:", response)
-                    return response
-                elif tool_name == "describe_robot":
-                    text = describe_robot(sim)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "result": {
-                            "content": [
-                                {"type": "text", "text": text}
-                            ]
-                        }
-                    }
-                    print("📤 Responding with:", response)
-                    return response
-                elif tool_name == "describe_scene":
-                    objects = describe_scene(sim)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "result": {
-                            "content": [
-                                {"type": "text", "text": (
-                                    "Objects:\n" +
-                                    "\n".join(
-                                        f"{o.get('name', '')} (type: {o.get('type', '')}, pos: {o.get('position', '')}, orient: {o.get('orientation', '')})"
-                                        for o in objects
-                                    )
-                                )}
-                            ]
-                        }
-                    }
-                    print("📤 Responding with:", response)
-                    return response
-                elif tool_name == "list_joints":
-                    joints = list_joints(sim)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "result": {
-                            "content": [
-                                {"type": "text", "text": "\n".join(
-                                    f"{j['alias']} (id: {j['id']}), pos: {j['position']}, type: {j['type']}, limits: {j['limits_deg']}"
-                                    for j in joints
-                                )}
-                            ]
-                        }
-                    }
-                    print("📤 Responding with:", response)
-                    return response
-                else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": rpc_id,
-                        "error": {
-                            "code": -32601,
-                            "message": f"Tool '{tool_name}' not found"
-                        }
-                    }
-                    print("📤 Responding with:", response)
-                    return response
-            except Exception as e:
-                print(f"💥 Exception in tool '{tool_name}':", str(e))
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "error": {
-                        "code": -32603,
-                        "message": f"Internal error in tool '{tool_name}': {str(e)}"
                     }
                 }
-                print("📤 Responding with:", response)
-                return response
-
-        elif method == "resources/list":
-            response = {
-                "jsonrpc": "2.0",
-                "id": rpc_id,
-                "result": {
-                    "resources": resources
-                }
             }
-            print("📤 Responding with:", response)
-            return response
-
-        elif method == "prompts/list":
-            response = {
-                "jsonrpc": "2.0",
-                "id": rpc_id,
-                "result": {
-                    "prompts": list_prompts_metadata()
+        }
+    }
+})
+async def call_describe_robot(arguments, rpc_id):
+    robots = await run_tool(arguments, describe_robot)
+    return render_result(robots, "robots", format_robots, arguments)
+
+@dispatcher.tool({
+    "name": "describe_scene",
+    "description": "Describes the scene objects (excluding robot joints).",
+    "annotations": {"readOnlyHint": True},
+    "inputSchema": {
+        "type": "object",
+        "properties": {**OUTPUT_PROPERTIES, **SIMULATOR_PROPERTY}
+    },
+    "resultSchema": {
+        "type": "object",
+        "properties": {
+            "objects": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "type": {"type": "integer", "description": "CoppeliaSim object type code"},
+                        "position": {"type": "array", "items": {"type": "number"}},
+                        "orientation": {"type": "array", "items": {"type": "number"}}
+                    }
                 }
             }
-            print("📤 Responding with:", response)
-            return response
-
-        elif method == "prompts/get":
-            prompt_name = params.get("name")
-            arguments = params.get("arguments", {})
-            prompt = get_prompt_by_name(prompt_name, arguments)
-            if prompt is None:
-                return {
-                    "jsonrpc": "2.0",
-                    "id": rpc_id,
-                    "error": {
-                        "code": -32602,
-                        "message": f"Prompt '{prompt_name}' not found"
+        }
+    }
+})
+async def call_describe_scene(arguments, rpc_id):
+    objects = await run_tool(arguments, describe_scene)
+    return render_result(objects, "objects", format_scene, arguments)
+
+@dispatcher.tool({
+    "name": "list_joints",
+    "description": "Lists all joints with their types and limits.",
+    "annotations": {"readOnlyHint": True},
+    "inputSchema": {
+        "type": "object",
+        "properties": {**OUTPUT_PROPERTIES, **SIMULATOR_PROPERTY}
+    },
+    "resultSchema": {
+        "type": "object",
+        "properties": {
+            "joints": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "alias": {"type": "string"},
+                        "position": {"type": "number"},
+                        "type": {"type": "integer", "description": "CoppeliaSim joint type code"},
+                        "limits_deg": {
+                            "type": "array",
+                            "items": {"type": ["number", "string"]},
+                            "description": "[min, max] in degrees, or ['Cyclic', 'Cyclic']"
+                        }
                     }
                 }
-            return {
-                "jsonrpc": "2.0",
-                "id": rpc_id,
-                "result": {
-                    "description": prompt.get("description", ""),
-                    "messages": prompt["messages"]
-                }
-            }
-
-        response = {
-            "jsonrpc": "2.0",
-            "id": rpc_id,
-            "error": {
-                "code": -32601,
-                "message": f"Method '{method}' not supported"
             }
         }
-        print("📤 Responding with:", response)
-        return response
-
+    }
+})
+async def call_list_joints(arguments, rpc_id):
+    joints = await run_tool(arguments, list_joints)
+    return render_result(joints, "joints", format_joints, arguments)
+
+
+async def answer(body, path: str):
+    # Payloads are only encoded for the log at DEBUG level, truncated to MCP_LOG_PAYLOAD_CHARS
+    started = time.perf_counter()
+    log.debug("📦 Request JSON via %s: %s", path, Payload(body))
+    response = await dispatcher.handle_payload(body)
+    log.debug("📤 Responding with: %s", Payload(response))
+    if isinstance(body, list):
+        method, rpc_id = f"batch[{len(body)}]", None
+    else:
+        method, rpc_id = body.get("method"), body.get("id")
+    duration_ms = elapsed_ms(started)
+    log.info("🔧 %s %s (id: %s) in %s ms", path, method, rpc_id, duration_ms,
+             extra={"sampled": True, "path": path, "method": method, "id": rpc_id, "duration_ms": duration_ms})
+    return response
+
+async def answer_in_session(session, body):
+    try:
+        # The session id also binds the session to one simulator, see pool.SimPool
+        current_session.set(session.id)
+        response = await answer(body, "/messages")
     except Exception as e:
-        print("💥 Exception in handler:", str(e))
-        response = {
-            "jsonrpc": "2.0",
-            "id": None,
-            "error": {
-                "code": -32603,
-                "message": f"Internal error: {str(e)}"
-            }
-        }
-        print("📤 Responding with:", response)
+        log.error(f"💥 Exception in handler: {str(e)}")
+        response = Dispatcher.error(None, -32603, f"Internal error: {str(e)}")
+    finally:
+        session.inflight -= 1
+    # Notifications (requests without an id) get no response
+    if response is not None and not (isinstance(body, dict) and "id" not in body):
+        await session.deliver({"event": "message", "data": response})
+
+def create_app():
+    """Build the FastAPI app. FastAPI is only imported here, so --stdio never loads it."""
+    from fastapi import FastAPI, HTTPException, Request, Response
+    from sse_starlette.sse import EventSourceResponse
+
+    app = FastAPI()
+
+    @app.on_event("startup")
+    def start():
+        start_simulators()
+
+    @app.on_event("shutdown")
+    def shutdown_simulators():
+        sim_pool.shutdown()
+
+    @app.get("/cache/stats")
+    def cache_stats():
+        return sim_pool.caches.stats()
+
+    @app.get("/trace/stats")
+    def trace_stats():
+        return {instance.name: sim.stats() for instance in sim_pool
+                if isinstance(sim := instance.connection.sim, TracedSim)}
+
+    @app.get("/simulators")
+    def simulators_status():
+        return sim_pool.status()
+
+    @app.get("/sessions")
+    def sessions_status():
+        return sse_sessions.stats()
+
+    @app.get("/healthz")
+    def healthz():
+        # Readiness: 503 until a simulator is connected
+        health = sim_pool.health()
+        health["startup_ms"] = round(startup.ready_seconds * 1000) if startup.ready_seconds is not None else None
+        return Response(content=dumps(health), media_type="application/json",
+                        status_code=200 if health["ready"] else 503)
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+    def json_response(text: str) -> Response:
+        if text is None:
+            # A batch made only of notifications has nothing to answer
+            return Response(status_code=204)
+        return Response(content=text, media_type="application/json")
+
+    async def handle_request(request: Request, path: str) -> Response:
+        body = loads(await request.body())
+        # Tool calls of one client session stick to one simulator, see pool.SimPool
+        session_id = request.headers.get("mcp-session-id")
+        issued = session_id is None and any(isinstance(r, dict) and r.get("method") == "initialize"
+                                            for r in (body if isinstance(body, list) else [body]))
+        if issued:
+            # As in MCP's HTTP transport: the client sends the id back on its later requests
+            session_id = uuid.uuid4().hex
+        current_session.set(session_id)
+        response = json_response(await answer(body, path))
+        if issued:
+            response.headers["Mcp-Session-Id"] = session_id
         return response
 
+    # SSE endpoint
+    @app.api_route("/sse", methods=["GET", "POST"])
+    async def sse(request: Request):
+        if request.method == "POST":
+            try:
+                return await handle_request(request, "/sse")
+            except Exception as e:
+                return json_response(Dispatcher.error(None, -32603, f"Exception: {str(e)}"))
+
+        # Optional telemetry, e.g. GET /sse?telemetry=joints,poses&rate=20&simulator=cell1
+        telemetry = request.query_params.get("telemetry")
+        if telemetry:
+            try:
+                telemetry_hub = telemetry_hub_for(sim_pool.pick(request.query_params.get("simulator"),
+                                                                request.headers.get("mcp-session-id")))
+                rate = float(request.query_params.get("rate", "10"))
+                if not math.isfinite(rate) or rate <= 0:
+                    raise ValueError(f"Invalid rate: {rate}")
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        try:
+            session = sse_sessions.open()
+        except SessionLimitError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        async def event_generator():
+            loop = asyncio.get_running_loop()
+            queue = session.queue
+            cursor = None
+            # Heartbeats keep an attached stream from counting as idle, see sessions.py
+            heartbeat = min(10.0, sse_sessions.idle_timeout / 3)
+            if telemetry:
+                cursor = telemetry_hub.subscribe(telemetry.split(","), rate)
+            # MCP SSE transport: the client POSTs its messages to this URL, answers come on this stream
+            yield {"event": "endpoint", "data": f"{request.scope.get('root_path', '')}/messages?session_id={session.id}"}
+            last_sent = loop.time()
+            try:
+                while not session.closed:
+                    if await request.is_disconnected():
+                        break
+                    event = None
+                    if not queue.empty():
+                        event = queue.get_nowait()
+                    elif cursor is not None:
+                        try:
+                            event = await cursor.next_event(timeout=0.25)
+                        except TelemetryLagError as e:
+                            log.warning(f"⚠️ Dropping slow SSE client: {str(e)}")
+                            break
+                    else:
+                        try:
+                            event = await asyncio.wait_for(queue.get(), heartbeat)
+                        except asyncio.TimeoutError:
+                            pass
+                    if event is None:
+                        if loop.time() - last_sent < heartbeat:
+                            continue
+                        event = {
+                            "event": "ping",
+                            "data": "heartbeat"
+                        }
+                    last_sent = loop.time()
+                    yield event
+                    # Only reached once the client has taken the event
+                    session.touch()
+            finally:
+                sse_sessions.close(session)
+                if cursor is not None:
+                    telemetry_hub.unsubscribe(cursor)
+
+        return EventSourceResponse(event_generator())
+
+    @app.post("/messages")
+    async def session_message(request: Request):
+        # Messages of a GET /sse session: accepted at once, answered on the session's stream
+        session = sse_sessions.get(request.query_params.get("session_id"))
+        if session is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session")
+        try:
+            body = loads(await request.body())
+        except ValueError as e:
+            return json_response(Dispatcher.error(None, -32700, f"Parse error: {str(e)}"))
+        if session.inflight + session.queue.qsize() >= sse_sessions.max_queue:
+            raise HTTPException(status_code=429, detail="Too many requests pending for this session")
+        session.touch()
+        session.inflight += 1
+        session.spawn(answer_in_session(session, body))
+        return Response(status_code=202)
+
+    @app.post("/")
+    async def jsonrpc_handler(request: Request):
+        try:
+            return await handle_request(request, "/")
+        except Exception as e:
+            log.error(f"💥 Exception in handler: {str(e)}")
+            return json_response(Dispatcher.error(None, -32603, f"Internal error: {str(e)}"))
+
+    return app
+
+def __getattr__(name):
+    # `coppelia_mcp.app` (e.g. for `uvicorn coppelia_mcp:app`) is built on first access
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def serve_stdio(stdin=None, stdout=None):
+    """Serve newline-delimited JSON-RPC on stdin/stdout until stdin closes.
+
+    Requests are answered concurrently, each response written as one line as
+    soon as it is ready; notifications get none. Logs go to stderr.
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    loop = asyncio.get_running_loop()
+    # The whole stdio client is one session, bound to one simulator
+    current_session.set("stdio")
+    pending = set()
+    start_simulators()
+
+    async def respond(line: bytes):
+        try:
+            body = loads(line)
+        except ValueError as e:
+            response = Dispatcher.error(None, -32700, f"Parse error: {str(e)}")
+        else:
+            try:
+                response = await answer(body, "stdio")
+            except Exception as e:
+                log.error(f"💥 Exception in handler: {str(e)}")
+                response = Dispatcher.error(None, -32603, f"Internal error: {str(e)}")
+            if isinstance(body, dict) and "id" not in body:
+                response = None
+        if response is not None:
+            stdout.write(response.encode() + b"\n")
+            stdout.flush()
+
+    while True:
+        # Blocking reads run on a helper thread, so responses keep flowing meanwhile
+        line = await loop.run_in_executor(None, stdin.readline)
+        if not line:
+            break
+        if line.strip():
+            task = asyncio.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+    sim_pool.shutdown()
+
 if __name__ == "__main__":
-    import uvicorn
     parser = argparse.ArgumentParser(description="CoppeliaSim MCP Server")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Host to bind the server to")
     parser.add_argument("--port", type=int, default=8000, help="Port to bind the server to")
+    parser.add_argument("--stdio", action="store_true",
+                        help="Serve newline-delimited JSON-RPC on stdin/stdout instead of HTTP")
     parser.add_argument("--coppeliaHost", type=str, default=None, help="Host for CoppeliaSim ZeroMQ remote API")
+    parser.add_argument("--simulators", type=str, default=None, metavar="LIST",
+                        help="Simulator instances, e.g. cell1=10.0.0.5:23000,cell2=10.0.0.6:23000")
+    parser.add_argument("--fake-sim", type=str, default=None, metavar="SPEC",
+                        help="Use the simulated backend, e.g. objects=1000,robots=4,latency=0.001")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Log the slowest imports once the server is ready (same as MCP_IMPORT_PROFILE=1)")
     args = parser.parse_args()
-
-    uvicorn.run(app, host=args.host, port=args.port)
-
+    if args.fake_sim:
+        os.environ["MCP_FAKE_SIM"] = args.fake_sim
+    if args.coppeliaHost:
+        os.environ["COPPELIASIM_HOST"] = args.coppeliaHost
+    if args.simulators:
+        sim_pool.configure(parse_simulators(args.simulators))
+
+    if args.stdio or os.environ.get("MCP_TRANSPORT") == "stdio":
+        asyncio.run(serve_stdio())
+    else:
+        import uvicorn
+        uvicorn.run(create_app(), host=args.host, port=args.port, ws="none")  # No websocket routes
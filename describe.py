@@ -1,16 +1,34 @@
 from coppeliasim_zmqremoteapi_client import RemoteAPIClient
+import functools
 import logging
 import math
+from metrics import Metrics
+from tracing import TracedSim
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+# Traffic counters shared by the traced sim proxies below
+metrics = Metrics()
+
+def traced(func):
+    # Connects, then runs func(sim) with every sim call recorded.
+    # Set MCP_TRACE_DIR to also write a Chrome trace per invocation.
+    @functools.wraps(func)
+    def run():
+        client = metrics.instrument_client(RemoteAPIClient())
+        sim = TracedSim(client.getObject('sim'), metrics.zmq)
+        with sim.trace(func.__name__):
+            result = func(sim)
+        logging.info(f"{func.__name__} sim calls: {sim.stats()}")
+        return result
+    return run
+
 # Function to describe the robot
 
-def describe_robot():
+@traced
+def describe_robot(sim):
     logging.info("Executing detailed describe_robot function")
-    client = RemoteAPIClient()
-    sim = client.getObject('sim')
 
     # Get all objects in the scene
     all_handles = sim.getObjectsInTree(sim.handle_scene, sim.handle_all)
@@ -52,10 +70,9 @@ def describe_robot():
 
 # Function to list joints
 
-def list_joints():
+@traced
+def list_joints(sim):
     logging.info("Executing list_joints function")
-    client = RemoteAPIClient()
-    sim = client.getObject('sim')
     
     # Correct the call to sim.getObjects with the required arguments
     joint_handles = sim.getObjects(sim.object_joint_type, -1)
@@ -80,10 +97,9 @@ def list_joints():
     
     return {"joints": joints}
 
-def describe_scene():
+@traced
+def describe_scene(sim):
     logging.info("Executing describe_scene function")
-    client = RemoteAPIClient()
-    sim = client.getObject('sim')
     # Get all objects in the scene
     object_handles = sim.getObjectsInTree(sim.handle_scene)
     # Get robot joint handles to exclude them
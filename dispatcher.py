@@ -0,0 +1,171 @@
+# Table-driven JSON-RPC dispatcher shared by all MCP endpoints
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import time
+
+from connection import SimUnavailableError
+from executor import SimBusyError
+from jsonfast import dumps
+
+# progressToken the client sent with the tools/call being handled (params._meta),
+# or None: tools may only send notifications/progress for a token they were given
+progress_token = contextvars.ContextVar("progress_token", default=None)
+
+
+class JsonRpcError(Exception):
+    """Raised by method and tool handlers to return a JSON-RPC error object."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Dispatcher:
+    """Routes JSON-RPC requests through a method registry and a tool registry.
+
+    Methods whose result never changes (initialize, tools/list, ...) are registered
+    with their result pre-serialized, so answering them costs one dict lookup and a
+    string splice. Responses are returned as JSON strings, encoded with
+    jsonfast.dumps.
+    """
+
+    def __init__(self, batch_scope=None, metrics=None):
+        self.methods = {}
+        self.tools = {}
+        self._static = {}
+        # Context manager factory wrapped around each batch, e.g. SceneCache.pinned
+        self._batch_scope = batch_scope or contextlib.nullcontext
+        self.max_batch = int(os.environ.get("MCP_MAX_BATCH", "100"))
+        # Optional metrics.Metrics, timing every method
+        self.metrics = metrics
+        self.method("tools/call")(self._call_tool)
+
+    def method(self, name: str):
+        """Register an async handler(params, rpc_id) returning the result object."""
+        def register(handler):
+            self.methods[name] = handler
+            return handler
+        return register
+
+    def static_method(self, name: str, result):
+        """Register a method that always returns the same result."""
+        self._static[name] = dumps(result)
+
+    def tool(self, definition: dict):
+        """Register an async tool handler(arguments, rpc_id) under definition["name"].
+
+        The handler returns either a text string or a complete result object.
+        """
+        def register(handler):
+            self.tools[definition["name"]] = (definition, handler)
+            self.static_method("tools/list", {"tools": [d for d, _ in self.tools.values()]})
+            return handler
+        return register
+
+    async def _call_tool(self, params, rpc_id):
+        tool_name = params.get("name")
+        arguments = params.get("arguments") or {}
+        entry = self.tools.get(tool_name)
+        if entry is None:
+            raise JsonRpcError(-32601, f"Tool '{tool_name}' not found")
+        token = progress_token.set((params.get("_meta") or {}).get("progressToken"))
+        try:
+            result = await entry[1](arguments, rpc_id)
+        except (JsonRpcError, SimBusyError, SimUnavailableError):
+            raise
+        except ValueError as e:
+            # Bad argument values, e.g. an unknown output mode
+            raise JsonRpcError(-32602, f"Invalid params for tool '{tool_name}': {str(e)}")
+        except Exception as e:
+            logging.exception(f"Error in tool '{tool_name}': {str(e)}")
+            raise JsonRpcError(-32603, f"Internal error in tool '{tool_name}': {str(e)}")
+        finally:
+            progress_token.reset(token)
+        if isinstance(result, str):
+            result = {"content": [{"type": "text", "text": result}]}
+        return result
+
+    def is_read_only(self, body) -> bool:
+        """True for requests that cannot change the simulation."""
+        if not isinstance(body, dict) or body.get("method") != "tools/call":
+            return True
+        entry = self.tools.get((body.get("params") or {}).get("name"))
+        return entry is not None and entry[0].get("annotations", {}).get("readOnlyHint", False)
+
+    async def handle_payload(self, body):
+        """Answer a request object or a JSON-RPC batch array.
+
+        In a batch, runs of consecutive read-only requests are answered together
+        and mutating tool calls run one at a time, in order. The whole batch reads
+        the scene through one batch_scope, so read-only calls share one snapshot.
+        Returns None when a batch held only notifications.
+        """
+        if not isinstance(body, list):
+            return await self.handle(body)
+        if not body:
+            return self.error(None, -32600, "Invalid request: empty batch")
+        if len(body) > self.max_batch:
+            return self.error(None, -32600, f"Invalid request: batch larger than {self.max_batch}")
+        responses = []
+        with self._batch_scope():
+            group = []
+            for request in body + [None]:
+                if request is not None and self.is_read_only(request):
+                    group.append(request)
+                    continue
+                if group:
+                    responses.extend(await asyncio.gather(*(self.handle(r) for r in group)))
+                    group = []
+                if request is not None:
+                    responses.append(await self.handle(request))
+        # Notifications (requests without an id) get no response
+        parts = [r for r, request in zip(responses, body)
+                 if not isinstance(request, dict) or "id" in request]
+        if not parts:
+            return None
+        return "[" + ",".join(parts) + "]"
+
+    async def handle(self, body) -> str:
+        """Answer one JSON-RPC request object and return the response as JSON."""
+        if self.metrics is None:
+            return (await self._answer(body))[0]
+        started = time.perf_counter()
+        response, method, failed = await self._answer(body)
+        # Unregistered method names come from clients: fold them into one label
+        if method not in self._static and method not in self.methods:
+            method = "unknown"
+        self.metrics.observe_method(method, time.perf_counter() - started, failed)
+        return response
+
+    async def _answer(self, body):
+        # Returns (response JSON, method, whether it is an error response)
+        try:
+            rpc_id = body.get("id")
+            method = body.get("method")
+        except AttributeError:
+            return self.error(None, -32600, "Invalid request"), None, True
+        cached = self._static.get(method)
+        if cached is not None:
+            return f'{{"jsonrpc":"2.0","id":{dumps(rpc_id)},"result":{cached}}}', method, False
+        handler = self.methods.get(method)
+        if handler is None:
+            return self.error(rpc_id, -32601, f"Method '{method}' not supported"), method, True
+        try:
+            result = await handler(body.get("params") or {}, rpc_id)
+        except JsonRpcError as e:
+            return self.error(rpc_id, e.code, e.message), method, True
+        except (SimBusyError, SimUnavailableError) as e:
+            return self.error(rpc_id, -32000, str(e)), method, True
+        except Exception as e:
+            logging.exception(f"Error in method '{method}': {str(e)}")
+            return self.error(rpc_id, -32603, f"Internal error: {str(e)}"), method, True
+        return dumps({"jsonrpc": "2.0", "id": rpc_id, "result": result}), method, False
+
+    @staticmethod
+    def error(rpc_id, code: int, message: str) -> str:
+        return dumps({"jsonrpc": "2.0", "id": rpc_id, "error": {"code": code, "message": message}})
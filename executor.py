@@ -0,0 +1,60 @@
+# Serialized execution of CoppeliaSim remote API calls off the asyncio event loop
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SimBusyError(Exception):
+    """Raised when too many simulator calls are already queued."""
+
+
+class SimExecutor:
+    """Runs blocking tool calls on a single worker thread.
+
+    The ZeroMQ RemoteAPIClient uses one REQ socket and is not thread-safe, so all
+    calls touching `sim` are serialized on one thread. The number of queued calls
+    is bounded: once `max_queue` calls are pending, new callers wait up to
+    `queue_timeout` seconds for a slot and then fail with SimBusyError.
+    """
+
+    def __init__(self, max_queue: int = None, queue_timeout: float = None):
+        if max_queue is None:
+            max_queue = int(os.environ.get("MCP_SIM_QUEUE_DEPTH", "32"))
+        if queue_timeout is None:
+            queue_timeout = float(os.environ.get("MCP_SIM_QUEUE_TIMEOUT", "5"))
+        self.max_queue = max(1, max_queue)
+        self.queue_timeout = queue_timeout
+        self.pending = 0
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="coppelia-sim")
+        self._slots = None
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the simulator thread and await its result."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise SimBusyError(f"Simulator busy: {self.pending} calls already queued")
+        self.pending += 1
+        try:
+            # In the caller's context, so e.g. a batch's SceneCache.pinned applies on the worker
+            future = self._pool.submit(contextvars.copy_context().run, functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        # Free the slot only once the worker is really done with the call, even if
+        # the awaiting request was cancelled in the meantime.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        self.pending -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
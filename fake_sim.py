@@ -0,0 +1,418 @@
+# In-process stand-in for CoppeliaSim's remote `sim` object, for benchmarks and offline runs
+#
+# FakeSim generates a synthetic scene and answers the subset of the remote API
+# used by tools.py, scene.py, telemetry.py and describe.py. Every call counts as
+# one round-trip and sleeps for `latency` seconds, like a call over ZMQ would.
+# Calls from several threads (separate client connections) overlap.
+# The batched Lua helpers of scene.LUA_HELPERS are recognised by their
+# --[[mcp:NAME]] marker and answered in one round-trip, so the batched and the
+# per-object code paths can both be measured.
+
+import collections
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from scene import LUA_HELPERS
+
+_scene_ids = itertools.count(1)
+_HELPER_CALL = re.compile(r"--\[\[mcp:(\w+)\]\].*end\)\((.*)\)(?:@lua)?$", re.S)
+
+
+def parse_lua_args(text: str) -> list:
+    """Parse the argument list rendered by scene._lua_literal back into Python values."""
+    pos = 0
+
+    def skip():
+        nonlocal pos
+        while pos < len(text) and text[pos] in " \t\n,":
+            pos += 1
+
+    def value():
+        nonlocal pos
+        skip()
+        if text[pos] == "{":
+            pos += 1
+            items = []
+            skip()
+            while text[pos] != "}":
+                items.append(value())
+                skip()
+            pos += 1
+            return items
+        if text[pos] == '"':
+            decoded, end = json.JSONDecoder().raw_decode(text, pos)
+            pos = end
+            return decoded
+        match = re.compile(r"true|false|nil|[-+0-9.eEinfa]+").match(text, pos)
+        if match is None:
+            raise ValueError(f"Cannot parse Lua literal at {text[pos:pos + 20]!r}")
+        pos = match.end()
+        token = match.group(0)
+        if token in ("true", "false"):
+            return token == "true"
+        if token == "nil":
+            return None
+        return float(token) if any(c in token for c in ".eEn") else int(token)
+
+    args = []
+    skip()
+    while pos < len(text):
+        args.append(value())
+        skip()
+    return args
+
+
+class FakeSim:
+    """A synthetic scene of `objects` objects, `robots` of which are joint chains.
+
+    Each robot is a dummy base followed by `joints_per_robot` revolute joints,
+    each carrying a link shape; the remaining objects are shapes and dummies,
+    some nested under each other. With lua=False, executeScriptString fails the
+    way it does on servers without a sandbox script, which exercises the
+    per-object fallback paths. `item_latency` is charged per object a batched
+    helper reads, on top of `latency`, so large batched queries take longer.
+    """
+
+    handle_scene = -12
+    handle_all = -2
+    handle_world = -1
+    object_shape_type = 0
+    object_joint_type = 1
+    object_dummy_type = 5
+    joint_revolute_subtype = 10
+    scripttype_sandbox = 6
+    intparam_scene_unique_id = 140
+    simulation_stopped = 0
+    simulation_advancing_running = 17
+
+    def __init__(self, objects: int = 100, robots: int = 2, joints_per_robot: int = 6,
+                 latency: float = 0.0, lua: bool = True, seed: int = 0, item_latency: float = 0.0):
+        self.latency = latency
+        self.item_latency = item_latency
+        self.lua = lua
+        self.calls = collections.Counter()
+        self._calls_lock = threading.Lock()
+        self.time_step = 0.05
+        self.sim_time = 0.0
+        self.state = self.simulation_stopped
+        self.stepping = False
+        self.scene_id = next(_scene_ids)
+        self._build(objects, robots, joints_per_robot, random.Random(seed))
+
+    def _build(self, objects, robots, joints_per_robot, rng):
+        self.order = []  # Handles in scene tree order
+        self.parent, self.type, self.alias = {}, {}, {}
+        self.position, self.orientation = {}, {}
+        self.joint_position, self.joint_target, self.joint_interval = {}, {}, {}
+
+        def add(obj_type, alias, parent):
+            handle = len(self.order) + 10
+            self.order.append(handle)
+            self.parent[handle] = parent
+            self.type[handle] = obj_type
+            self.alias[handle] = alias
+            self.position[handle] = [rng.uniform(-2, 2), rng.uniform(-2, 2), rng.uniform(0, 1)]
+            self.orientation[handle] = [0.0, 0.0, rng.uniform(-math.pi, math.pi)]
+            return handle
+
+        for r in range(robots):
+            parent = add(self.object_dummy_type, f"Robot{r}", -1)
+            for j in range(joints_per_robot):
+                joint = add(self.object_joint_type, f"joint{j + 1}" if r == 0 else f"Robot{r}_joint{j + 1}", parent)
+                # Every third joint is cyclic, the others span +-170 degrees
+                cyclic = j % 3 == 2
+                self.joint_interval[joint] = (cyclic, [-math.pi, 2 * math.pi] if cyclic
+                                              else [math.radians(-170), math.radians(340)])
+                self.joint_position[joint] = self.joint_target[joint] = 0.0
+                parent = add(self.object_shape_type, f"link{j + 1}" if r == 0 else f"Robot{r}_link{j + 1}", joint)
+        top = []
+        while len(self.order) < objects:
+            index = len(self.order)
+            parent = rng.choice(top) if top and rng.random() < 0.3 else -1
+            handle = add(rng.choice((self.object_shape_type, self.object_dummy_type)), f"Object{index}", parent)
+            if parent == -1:
+                top.append(handle)
+        self._reorder()
+
+    def _reorder(self):
+        # Scene tree order: depth-first from the top-level objects
+        children = collections.defaultdict(list)
+        for h in self.order:
+            children[self.parent[h]].append(h)
+
+        def walk(h):
+            yield h
+            for c in children[h]:
+                yield from walk(c)
+        self.children = children
+        self.order = [h for root in children[-1] for h in walk(root)]
+        self._checksum = None
+
+    def _rpc(self, name: str, items: int = 0):
+        with self._calls_lock:
+            self.calls[name] += 1
+        delay = self.latency + self.item_latency * items
+        if delay:
+            time.sleep(delay)
+
+    @property
+    def rpc_count(self) -> int:
+        return sum(self.calls.values())
+
+    # Scene queries
+
+    def getObjectsInTree(self, root, obj_type=-2, options=0):
+        self._rpc("getObjectsInTree")
+        if root == self.handle_scene:
+            handles = self.order
+        else:
+            def walk(h):
+                yield h
+                for c in self.children[h]:
+                    yield from walk(c)
+            handles = list(walk(root))
+        return [h for h in handles if obj_type == self.handle_all or self.type[h] == obj_type]
+
+    def getObjects(self, obj_type, options=-1):
+        self._rpc("getObjects")
+        return [h for h in self.order if self.type[h] == obj_type]
+
+    def getObject(self, path, options=None):
+        self._rpc("getObject")
+        name = path.rsplit("/", 1)[-1]
+        for h in self.order:
+            if self.alias[h] == name:
+                return h
+        raise Exception(f"object does not exist: {path}")
+
+    def getObjectHandle(self, name):
+        self._rpc("getObjectHandle")
+        for h in self.order:
+            if self.alias[h] == name:
+                return h
+        raise Exception(f"object does not exist: {name}")
+
+    def isHandle(self, handle):
+        self._rpc("isHandle")
+        return handle in self.type
+
+    def getObjectAlias(self, handle, options=-1):
+        self._rpc("getObjectAlias")
+        return self.alias[handle]
+
+    def getObjectName(self, handle):
+        self._rpc("getObjectName")
+        return self.alias[handle]
+
+    def getObjectType(self, handle):
+        self._rpc("getObjectType")
+        return self.type[handle]
+
+    def getObjectParent(self, handle):
+        self._rpc("getObjectParent")
+        return self.parent[handle]
+
+    def getObjectPosition(self, handle, relative_to=-1):
+        self._rpc("getObjectPosition")
+        return list(self.position[handle])
+
+    def getObjectOrientation(self, handle, relative_to=-1):
+        self._rpc("getObjectOrientation")
+        return list(self.orientation[handle])
+
+    def getJointType(self, handle):
+        self._rpc("getJointType")
+        return self.joint_revolute_subtype
+
+    def getJointInterval(self, handle):
+        self._rpc("getJointInterval")
+        cyclic, interval = self.joint_interval[handle]
+        return cyclic, list(interval)
+
+    def getJointPosition(self, handle):
+        self._rpc("getJointPosition")
+        return self.joint_position[handle]
+
+    def setJointTargetPosition(self, handle, target):
+        self._rpc("setJointTargetPosition")
+        if handle not in self.joint_target:
+            raise Exception(f"object is not a joint: {handle}")
+        self.joint_target[handle] = target
+        if self.state == self.simulation_stopped:
+            self.joint_position[handle] = target
+
+    # Scene editing
+
+    def removeObjects(self, handles):
+        self._rpc("removeObjects")
+        for h in handles:
+            for column in (self.parent, self.type, self.alias, self.position, self.orientation,
+                           self.joint_position, self.joint_target, self.joint_interval):
+                column.pop(h, None)
+        # Children of removed objects move to the top level, as in CoppeliaSim
+        for h, parent in self.parent.items():
+            if parent not in self.parent:
+                self.parent[h] = -1
+        self.order = [h for h in self.order if h in self.type]
+        self._reorder()
+
+    def createDummy(self, size):
+        self._rpc("createDummy")
+        handle = max(self.type, default=9) + 1
+        self.order.append(handle)
+        self.parent[handle] = -1
+        self.type[handle] = self.object_dummy_type
+        self.alias[handle] = "Dummy"
+        self.position[handle] = [0.0, 0.0, 0.0]
+        self.orientation[handle] = [0.0, 0.0, 0.0]
+        self._reorder()
+        return handle
+
+    def setObjectAlias(self, handle, alias, options=0):
+        self._rpc("setObjectAlias")
+        self.alias[handle] = alias
+        self._checksum = None
+
+    def setObjectParent(self, handle, parent, keep_in_place=True):
+        self._rpc("setObjectParent")
+        self.parent[handle] = parent
+        self._reorder()
+
+    def getInt32Param(self, param):
+        self._rpc("getInt32Param")
+        return self.scene_id
+
+    # Simulation control
+
+    def getSimulationTime(self):
+        self._rpc("getSimulationTime")
+        return self.sim_time
+
+    def getSimulationState(self):
+        self._rpc("getSimulationState")
+        return self.state
+
+    def startSimulation(self):
+        self._rpc("startSimulation")
+        self.state = self.simulation_advancing_running
+
+    def stopSimulation(self):
+        self._rpc("stopSimulation")
+        self.state = self.simulation_stopped
+        self.sim_time = 0.0
+
+    def setStepping(self, enabled):
+        self._rpc("setStepping")
+        self.stepping = enabled
+
+    def step(self):
+        self._rpc("step")
+        self.sim_time += self.time_step
+        self.joint_position.update(self.joint_target)
+
+    # Batched Lua helpers
+
+    def getScript(self, script_type, *args):
+        self._rpc("getScript")
+        return 1
+
+    def executeScriptString(self, code, script=None):
+        if not self.lua:
+            self._rpc("executeScriptString")
+            raise Exception("Script does not exist")
+        match = _HELPER_CALL.search(code)
+        if match is None or match.group(1) not in LUA_HELPERS:
+            self._rpc("executeScriptString")
+            return 1, None
+        args = parse_lua_args(match.group(2))
+        # Objects the helper reads: the whole scene for "static" and "probe", else its handle lists
+        items = len(self.order) if match.group(1) in ("static", "probe") else sum(len(a) for a in args if isinstance(a, list))
+        self._rpc("executeScriptString", items)
+        return 0, getattr(self, f"_lua_{match.group(1)}")(*args)
+
+    def _lua_static(self):
+        joints = [h for h in self.order if self.type[h] == self.object_joint_type]
+        return {
+            "handles": list(self.order),
+            "aliases": [self.alias[h] for h in self.order],
+            "types": [self.type[h] for h in self.order],
+            "parents": [self.parent[h] for h in self.order],
+            "joint_handles": joints,
+            "joint_types": [self.joint_revolute_subtype] * len(joints),
+            "joint_cyclic": [self.joint_interval[h][0] for h in joints],
+            "joint_intervals": [list(self.joint_interval[h][1]) for h in joints],
+        }
+
+    def _lua_dynamic(self, handles, joint_handles):
+        return {
+            "positions": [list(self.position[h]) for h in handles],
+            "orientations": [list(self.orientation[h]) for h in handles],
+            "joint_positions": [self.joint_position[h] for h in joint_handles],
+        }
+
+    def _lua_set_targets(self, handles, targets, scene=None):
+        if scene is not None and scene != self.scene_id:
+            return -1
+        for h in handles:
+            if h not in self.joint_target:
+                # sim.setJointTargetPosition raises inside the helper, as in CoppeliaSim
+                raise Exception(f"object is not a joint: {h}")
+        for h, target in zip(handles, targets):
+            self.joint_target[h] = target
+            if self.state == self.simulation_stopped:
+                self.joint_position[h] = target
+        return len(handles)
+
+    def _lua_probe(self):
+        if self._checksum is None:
+            # Same checksum as the Lua helper; cached until the tree changes
+            total = 0
+            for h in self.order:
+                value = h * 131 + self.parent[h]
+                for byte in self.alias[h].encode():
+                    value = (value * 31 + byte) % 4294967291
+                total = (total * 1000003 + value) % 4294967291
+            self._checksum = total
+        return [self.scene_id, len(self.order), self._checksum, self.sim_time]
+
+
+class FakeClient:
+    """Stands in for RemoteAPIClient: getObject('sim') and client-side stepping."""
+
+    def __init__(self, sim: FakeSim = None, **scene):
+        self.sim = sim if sim is not None else FakeSim(**scene)
+
+    def getObject(self, name):
+        return self.sim
+
+    def setStepping(self, enabled=True):
+        self.sim.setStepping(enabled)
+
+    def step(self, wait=True):
+        self.sim.step()
+
+
+def client_from_spec(spec: str) -> FakeClient:
+    """Build a FakeClient from e.g. "objects=1000,robots=4,latency=0.001,lua=0".
+
+    Used for MCP_FAKE_SIM and --fake-sim; "1" or an empty spec uses the defaults.
+    """
+    kwargs = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        key, value = (part.strip() for part in item.split("=", 1))
+        if key in ("latency", "item_latency"):
+            kwargs[key] = float(value)
+        elif key == "lua":
+            kwargs[key] = value.lower() not in ("0", "false", "no", "off")
+        elif key in ("objects", "robots", "joints_per_robot", "seed"):
+            kwargs[key] = int(value)
+        else:
+            raise ValueError(f"Unknown fake sim option '{key}'")
+    return FakeClient(**kwargs)
@@ -0,0 +1,102 @@
+# Rendering of tool results as MCP content: LLM-friendly text and/or structured JSON
+
+import os
+
+from jsonfast import dumps
+
+TYPE_MAP = {
+    0: "shape",
+    1: "joint",
+    2: "graph",
+    3: "camera",
+    4: "light",
+    5: "dummy",
+    6: "proximity sensor",
+    7: "octree",
+    8: "point cloud",
+    9: "vision sensor",
+    10: "force sensor",
+    11: "script"
+}
+
+OUTPUT_MODES = ("text", "structured", "both")
+
+# Input schema properties shared by the describe tools
+OUTPUT_PROPERTIES = {
+    "output": {
+        "type": "string",
+        "enum": list(OUTPUT_MODES),
+        "description": "'text' (default), 'structured' for compact JSON in structuredContent, or 'both'."
+    },
+    "precision": {
+        "type": "integer",
+        "minimum": 0,
+        "description": "Round positions, orientations and limits to this many decimals."
+    }
+}
+
+
+def format_robots(robots) -> str:
+    if not robots:
+        return "No robots found in the scene."
+    def lines():
+        for robot in robots:
+            yield f"Robot base: {robot['base_name']} (handle: {robot['base_handle']})\n"
+            for elem in robot["elements"]:
+                type_name = TYPE_MAP.get(elem["type"], f"unknown({elem['type']})")
+                yield (
+                    f"  - {elem['name']} (type: {type_name}, handle: {elem['handle']}, "
+                    f"pos: {elem['position']}, orient: {elem['orientation']})\n"
+                )
+            yield "\n"
+    return "".join(lines())
+
+
+def format_scene(objects) -> str:
+    return "Objects:\n" + "\n".join(
+        f"{o.get('name', '')} (type: {o.get('type', '')}, pos: {o.get('position', '')}, orient: {o.get('orientation', '')})"
+        for o in objects
+    )
+
+
+def format_joints(joints) -> str:
+    return "\n".join(
+        f"{j['alias']} (id: {j['id']}), pos: {j['position']}, type: {j['type']}, limits: {j['limits_deg']}"
+        for j in joints
+    )
+
+
+def round_floats(value, precision: int):
+    """Return a copy of value with every float rounded; the input is not modified."""
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, dict):
+        return {k: round_floats(v, precision) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [round_floats(v, precision) for v in value]
+    return value
+
+
+def render_result(data, key: str, formatter, arguments: dict = None) -> dict:
+    """Build an MCP tool result for `data` in the requested output mode.
+
+    The output mode comes from the call's `output` argument, falling back to
+    MCP_OUTPUT_FORMAT. Structured results are sent as {key: data} in
+    structuredContent, mirrored as compact JSON text for clients that only read
+    content. Text is only rendered when the mode asks for it.
+    """
+    arguments = arguments or {}
+    mode = arguments.get("output") or os.environ.get("MCP_OUTPUT_FORMAT", "text")
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{mode}', expected one of {', '.join(OUTPUT_MODES)}")
+    precision = arguments.get("precision")
+    if precision is not None:
+        data = round_floats(data, int(precision))
+    if mode == "text":
+        return {"content": [{"type": "text", "text": formatter(data)}]}
+    structured = {key: data}
+    if mode == "structured":
+        text = dumps(structured)
+    else:
+        text = formatter(data)
+    return {"content": [{"type": "text", "text": text}], "structuredContent": structured}
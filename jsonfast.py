@@ -0,0 +1,43 @@
+# JSON encoding for responses: orjson when installed, the standard library otherwise
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+
+def _default(obj):
+    # NumPy arrays and scalars, or anything else exposing tolist()/item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> str:
+        """Encode obj as compact JSON.
+
+        Float lists such as getObjectPosition results are written directly by
+        orjson, without going through a generic encoder.
+        """
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode()
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"), default=_default)
+
+    def dumps(obj) -> str:
+        """Encode obj as compact JSON."""
+        return _encoder.encode(obj)
+
+    def loads(data):
+        return json.loads(data)
+
+BACKEND = "orjson" if orjson is not None else "json"
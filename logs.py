@@ -0,0 +1,135 @@
+# Leveled, non-blocking logging for the MCP servers
+#
+# Records are put on a bounded in-memory queue and formatted and written by a
+# background thread, so a log call on the event loop costs a queue put.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from jsonfast import dumps
+
+log = logging.getLogger("coppelia_mcp")
+
+_listener = None
+
+
+class Payload:
+    """Lazily encoded, truncated view of a request or response for log messages.
+
+    Nothing is encoded unless the record is actually written, and then on the
+    writer thread. `limit` <= 0 keeps the whole payload.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int = None):
+        self.value = value
+        self.limit = limit if limit is not None else int(os.environ.get("MCP_LOG_PAYLOAD_CHARS", "500"))
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else dumps(self.value)
+        if 0 < self.limit < len(text):
+            return f"{text[:self.limit]}... ({len(text)} chars)"
+        return text
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the writer thread and never blocks."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # The queue is in-process, so the record does not need to be picklable
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DeferredQueueHandler.dropped += 1
+
+
+class _Sampler(logging.Filter):
+    """Keep a `sample_rate` fraction of records logged with extra={"sampled": True}."""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, "sampled", False) and self.sample_rate < 1.0:
+            return random.random() < self.sample_rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra` fields as top-level keys."""
+
+    _standard = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sampled"}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._standard:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return dumps(entry)
+
+
+def setup_logging(level: str = None):
+    """Route all logging through the background writer (idempotent).
+
+    MCP_LOG_LEVEL (default INFO) sets the level; full request and response
+    payloads are only logged at DEBUG. MCP_LOG_FORMAT=json switches to JSON
+    lines. MCP_LOG_SAMPLE (0..1, default 1) samples the per-request lines.
+    MCP_LOG_QUEUE bounds the queue; records are dropped when it is full.
+    Logs go to stderr, leaving stdout free for stdio transports.
+    """
+    global _listener
+    if _listener is not None:
+        return log
+    level = (level or os.environ.get("MCP_LOG_LEVEL", "INFO")).upper()
+
+    writer = logging.StreamHandler(sys.stderr)
+    if os.environ.get("MCP_LOG_FORMAT", "text") == "json":
+        writer.setFormatter(JsonFormatter())
+    else:
+        writer.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+
+    handler = _DeferredQueueHandler(queue.Queue(int(os.environ.get("MCP_LOG_QUEUE", "10000"))))
+    handler.addFilter(_Sampler(float(os.environ.get("MCP_LOG_SAMPLE", "1"))))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return log
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
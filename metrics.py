@@ -0,0 +1,189 @@
+# Per-tool and per-method instrumentation, exported in the Prometheus text format
+
+import contextlib
+import threading
+import time
+
+# Prometheus client defaults, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUNDTRIP_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def render(self, name: str, labels: str) -> list:
+        lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                 for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class _ToolSeries:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.roundtrips = Histogram(ROUNDTRIP_BUCKETS)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.errors = 0
+
+
+class _CountingSocket:
+    """Wraps the RemoteAPIClient's ZMQ REQ socket to count round-trips and bytes.
+
+    Counts go to the server totals and to the client's own `counters`, if any.
+    """
+
+    def __init__(self, socket, metrics, counters=None):
+        self._socket = socket
+        self._totals = [metrics.zmq] if counters is None else [metrics.zmq, counters]
+
+    def send(self, data, *args, **kwargs):
+        for totals in self._totals:
+            totals["bytes_sent"] += len(data)
+        return self._socket.send(data, *args, **kwargs)
+
+    def recv(self, *args, **kwargs):
+        data = self._socket.recv(*args, **kwargs)
+        for totals in self._totals:
+            totals["roundtrips"] += 1
+            totals["bytes_received"] += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._socket, name)
+
+
+class Metrics:
+    """Wall time, ZMQ round-trips, bytes and cache hits per tool and per JSON-RPC method.
+
+    Round-trips and bytes are counted on the client socket (see instrument_client)
+    and attributed to a tool as the difference across its call. Tools run one at a
+    time per simulator, so the differences of that simulator's own counters and
+    cache belong to that tool alone.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.zmq = {"roundtrips": 0, "bytes_sent": 0, "bytes_received": 0}
+        self.tools = {}
+        self.methods = {}
+        self.method_errors = {}
+        self._lock = threading.Lock()
+
+    def instrument_client(self, client, counters: dict = None):
+        """Count the traffic of a RemoteAPIClient from now on, also into `counters`."""
+        if not isinstance(client.socket, _CountingSocket):
+            client.socket = _CountingSocket(client.socket, self, counters)
+        return client
+
+    @staticmethod
+    def _cache_totals(cache):
+        if cache is None:
+            return 0, 0
+        stats = cache.stats()
+        return (sum(s["hits"] for s in stats.values()),
+                sum(s["misses"] for s in stats.values()))
+
+    @contextlib.contextmanager
+    def tool(self, name: str, traffic: dict = None, cache=None):
+        """Measure the block as one invocation of tool `name`.
+
+        `traffic` and `cache` are the counters of the simulator the tool runs on,
+        by default the server totals.
+        """
+        traffic = self.zmq if traffic is None else traffic
+        cache = self.cache if cache is None else cache
+        zmq_before = dict(traffic)
+        hits_before, misses_before = self._cache_totals(cache)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            hits, misses = self._cache_totals(cache)
+            with self._lock:
+                series = self.tools.get(name)
+                if series is None:
+                    series = self.tools[name] = _ToolSeries()
+                series.duration.observe(elapsed)
+                series.roundtrips.observe(traffic["roundtrips"] - zmq_before["roundtrips"])
+                series.bytes_sent += traffic["bytes_sent"] - zmq_before["bytes_sent"]
+                series.bytes_received += traffic["bytes_received"] - zmq_before["bytes_received"]
+                series.cache_hits += hits - hits_before
+                series.cache_misses += misses - misses_before
+                series.errors += failed
+
+    def observe_method(self, method: str, seconds: float, failed: bool = False):
+        with self._lock:
+            histogram = self.methods.get(method)
+            if histogram is None:
+                histogram = self.methods[method] = Histogram(DURATION_BUCKETS)
+                self.method_errors[method] = 0
+            histogram.observe(seconds)
+            self.method_errors[method] += failed
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            tools = sorted(self.tools.items())
+            family("mcp_tool_duration_seconds", "histogram", "Wall time of tool calls on the simulator thread.")
+            for name, series in tools:
+                lines.extend(series.duration.render("mcp_tool_duration_seconds", f'tool="{name}"'))
+            family("mcp_tool_roundtrips", "histogram", "ZMQ round-trips per tool call.")
+            for name, series in tools:
+                lines.extend(series.roundtrips.render("mcp_tool_roundtrips", f'tool="{name}"'))
+            for metric, attr, help_text in (
+                    ("mcp_tool_bytes_sent_total", "bytes_sent", "Bytes sent to the simulator by tool calls."),
+                    ("mcp_tool_bytes_received_total", "bytes_received", "Bytes received from the simulator by tool calls."),
+                    ("mcp_tool_cache_hits_total", "cache_hits", "Scene cache hits during tool calls."),
+                    ("mcp_tool_cache_misses_total", "cache_misses", "Scene cache misses during tool calls."),
+                    ("mcp_tool_errors_total", "errors", "Tool calls that raised.")):
+                family(metric, "counter", help_text)
+                for name, series in tools:
+                    lines.append(f'{metric}{{tool="{name}"}} {getattr(series, attr)}')
+
+            family("mcp_method_duration_seconds", "histogram", "Wall time of JSON-RPC methods.")
+            for method, histogram in sorted(self.methods.items()):
+                lines.extend(histogram.render("mcp_method_duration_seconds", f'method="{method}"'))
+            family("mcp_method_errors_total", "counter", "JSON-RPC methods answered with an error.")
+            for method, errors in sorted(self.method_errors.items()):
+                lines.append(f'mcp_method_errors_total{{method="{method}"}} {errors}')
+
+        for key, help_text in (("roundtrips", "ZMQ round-trips to the simulator."),
+                               ("bytes_sent", "Bytes sent to the simulator."),
+                               ("bytes_received", "Bytes received from the simulator.")):
+            family(f"mcp_zmq_{key}_total", "counter", help_text)
+            lines.append(f"mcp_zmq_{key}_total {self.zmq[key]}")
+        if self.cache is not None:
+            stats = self.cache.stats()
+            for kind in ("hits", "misses"):
+                family(f"mcp_cache_{kind}_total", "counter", f"Scene cache {kind} per tier.")
+                for tier, counts in stats.items():
+                    lines.append(f'mcp_cache_{kind}_total{{tier="{tier}"}} {counts[kind]}')
+        return "\n".join(lines) + "\n"
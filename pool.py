@@ -0,0 +1,224 @@
+# Several CoppeliaSim instances behind one server, each with its own worker thread and scene cache
+
+import collections
+import contextlib
+import contextvars
+import itertools
+import os
+
+from cache import SceneCache, TIERS
+from connection import SimConnection, open_remote
+from executor import SimExecutor
+from logs import log
+from readers import ReaderPool
+from tracing import TracedSim
+
+# Session of the request being handled (the Mcp-Session-Id header), used for sticky routing
+current_session = contextvars.ContextVar("current_session", default=None)
+
+SIMULATOR_PROPERTY = {
+    "simulator": {
+        "type": "string",
+        "description": "Simulator instance to use (see GET /simulators). "
+                       "Default: the one bound to the session, or the least busy one."
+    }
+}
+
+
+def parse_simulators(spec: str) -> list:
+    """Parse e.g. "cell1=10.0.0.5:23000,cell2=10.0.0.6:23002" into [(name, host, port)].
+
+    Names are optional and default to sim0, sim1, ...; so is the port (23000).
+    """
+    simulators = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        name, _, address = item.rpartition("=")
+        host, _, port = address.partition(":")
+        simulators.append((name or f"sim{len(simulators)}", host, int(port or 23000)))
+    names = [name for name, _, _ in simulators]
+    if not simulators or len(set(names)) != len(names):
+        raise ValueError(f"Invalid simulator list '{spec}': empty or duplicate names")
+    return simulators
+
+
+def connect_instance(instance, reader: bool, default_host: str, metrics, say=log.info):
+    """Open a connection to `instance`: the open_sim callback of both servers.
+
+    `default_host` serves instances configured without a host. The main
+    connection is traced and instrumented, and resets the instance's scene cache
+    and readers, as it may face a restarted simulator with another scene.
+    Reader connections (reader=True) go to the same host, untraced. With
+    MCP_FAKE_SIM the simulated backend of fake_sim.py is used instead, and
+    readers share the scene of the main connection.
+    """
+    if os.environ.get("MCP_FAKE_SIM"):
+        from fake_sim import FakeClient, client_from_spec
+        if reader:
+            sim = instance.connection.client.sim
+            return FakeClient(sim=sim), sim
+        client = client_from_spec(os.environ["MCP_FAKE_SIM"])
+        sim = TracedSim(client.getObject('sim'))
+        say(f"Using simulated CoppeliaSim for '{instance.name}' ({os.environ['MCP_FAKE_SIM']})")
+    else:
+        host = instance.host or default_host
+        if not reader:
+            say(f"Attempting to connect to CoppeliaSim '{instance.name}' at {host}:{instance.port}")
+        client, sim = open_remote(host, instance.port)
+        metrics.instrument_client(client, instance.traffic)
+        if reader:
+            return client, sim
+        sim = TracedSim(sim, instance.traffic)
+    instance.cache.invalidate()
+    instance.readers.reset()
+    return client, sim
+
+
+class SimInstance:
+    """One simulator: its connection, worker thread, scene cache and ZMQ traffic totals.
+
+    `readers` holds the extra connections large scene queries are split across
+    (MCP_SIM_READERS, off by default). `host` None means the server's default
+    CoppeliaSim host, looked up on connect.
+    """
+
+    def __init__(self, name: str, host: str, port: int, open_sim):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.executor = SimExecutor()
+        self.readers = ReaderPool(lambda: open_sim(self, reader=True))
+        self.cache = SceneCache(readers=self.readers if self.readers.size else None)
+        self.traffic = {"roundtrips": 0, "bytes_sent": 0, "bytes_received": 0}
+        self.connection = SimConnection(lambda: open_sim(self))
+
+    def status(self) -> dict:
+        return {
+            "host": self.host,
+            "port": self.port,
+            "pending": self.executor.pending,
+            "readers": self.readers.opened,
+            **self.connection.status(),
+            **self.traffic,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown()
+        self.readers.shutdown()
+        self.connection.stop()
+
+
+class CacheGroup:
+    """The scene caches of all instances, seen as one for metrics and batches."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def stats(self) -> dict:
+        totals = {tier: {"hits": 0, "misses": 0} for tier in TIERS}
+        for instance in self.pool:
+            for tier, counts in instance.cache.stats().items():
+                totals[tier]["hits"] += counts["hits"]
+                totals[tier]["misses"] += counts["misses"]
+        return totals
+
+    def invalidate(self, tier: str = "static"):
+        for instance in self.pool:
+            instance.cache.invalidate(tier)
+
+    @contextlib.contextmanager
+    def pinned(self):
+        with contextlib.ExitStack() as stack:
+            for instance in self.pool:
+                stack.enter_context(instance.cache.pinned())
+            yield
+
+
+class SimPool:
+    """Routes tool calls to simulator instances.
+
+    The instances come from MCP_SIMULATORS (see parse_simulators), or are a single
+    "default" instance. A call goes to, in order:
+    - the instance named by its `simulator` argument,
+    - the instance bound to its session, if any,
+    - for a new session, the least busy instance whose circuit is closed (ties
+      go round-robin), which then stays bound to the session. The
+      MCP_SESSION_BINDINGS most recently used bindings are kept (default 1024),
+    - without a session, the first instance whose circuit is closed, so that
+      consecutive calls of a sessionless client reach the same simulator.
+
+    `open_sim(instance, reader=False)` connects an instance and returns
+    (client, sim); with reader=True it opens an extra connection to the same
+    simulator for instance.readers.
+    """
+
+    def __init__(self, open_sim, simulators: list = None, max_sessions: int = None):
+        self.open_sim = open_sim
+        self.max_sessions = (max_sessions if max_sessions is not None
+                             else int(os.environ.get("MCP_SESSION_BINDINGS", "1024")))
+        self.caches = CacheGroup(self)
+        if simulators is None:
+            spec = os.environ.get("MCP_SIMULATORS")
+            simulators = parse_simulators(spec) if spec else [("default", None, 23000)]
+        self.configure(simulators)
+
+    def configure(self, simulators: list):
+        """Replace the instances with [(name, host, port)], before the server starts."""
+        self.instances = {name: SimInstance(name, host, port, self.open_sim) for name, host, port in simulators}
+        self.sessions = collections.OrderedDict()
+        self._turn = itertools.count()
+
+    def __iter__(self):
+        return iter(list(self.instances.values()))
+
+    def __len__(self) -> int:
+        return len(self.instances)
+
+    @property
+    def default(self) -> SimInstance:
+        return next(iter(self.instances.values()))
+
+    def pick(self, name: str = None, session: str = None) -> SimInstance:
+        if name is not None:
+            instance = self.instances.get(name)
+            if instance is None:
+                raise ValueError(f"Unknown simulator '{name}' (available: {', '.join(self.instances)})")
+            return instance
+        if session is None:
+            return next((i for i in self.instances.values() if not i.connection.circuit_open), self.default)
+        instance = self.sessions.get(session)
+        if instance is not None:
+            self.sessions.move_to_end(session)
+            return instance
+        instance = self._least_busy()
+        self.sessions[session] = instance
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return instance
+
+    def _least_busy(self) -> SimInstance:
+        instances = list(self.instances.values())
+        candidates = [i for i in instances if not i.connection.circuit_open] or instances
+        # Rotate the starting point so idle instances take turns
+        start = next(self._turn) % len(candidates)
+        candidates = candidates[start:] + candidates[:start]
+        return min(candidates, key=lambda i: i.executor.pending)
+
+    def start(self):
+        """Connect every instance in the background instead of on first use."""
+        for instance in self:
+            instance.connection.start()
+
+    def health(self) -> dict:
+        """Readiness: at least one simulator is connected."""
+        connected = {instance.name: instance.connection.connected for instance in self}
+        return {"ready": any(connected.values()), "simulators": connected}
+
+    def status(self) -> dict:
+        bound = collections.Counter(instance.name for instance in self.sessions.values())
+        return {instance.name: {**instance.status(), "sessions": bound[instance.name]} for instance in self}
+
+    def shutdown(self):
+        for instance in self:
+            instance.shutdown()
@@ -57,6 +57,43 @@ PROMPTS = [
             }
         ]
     },
+    {
+        "name": "set_joint_positions_prompt",
+        "description": "Request to move several robot joints at once to a target pose. Users may list joints and angles together, e.g. for a full arm configuration.",
+        "arguments": [
+            {"name": "joints", "description": "Joint names and target angles in degrees (e.g., 'shoulder 30, elbow -45, wrist 10').", "required": True}
+        ],
+        "messages": [
+            {
+                "role": "system",
+                "content": {
+                    "type": "text",
+                    "text": "You are controlling a simulated robot. When the user asks to set several joints, use the set_joint_positions tool so all joints move together in one call instead of calling rotate_joint for each joint."
+                }
+            },
+            {
+                "role": "user",
+                "content": {
+                    "type": "text",
+                    "text": "Move the joints to this pose: {joints}."
+                }
+            },
+            {
+                "role": "user",
+                "content": {
+                    "type": "text",
+                    "text": "Set {joints} at the same time."
+                }
+            },
+            {
+                "role": "user",
+                "content": {
+                    "type": "text",
+                    "text": "Put the arm in the configuration {joints}."
+                }
+            }
+        ]
+    },
     {
         "name": "describe_scene",
         "description": "Request a description of all objects in the simulation scene, excluding robot joints. Users may ask about the workspace, environment, or objects present.",
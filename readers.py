@@ -0,0 +1,86 @@
+# Extra client connections to one simulator, for splitting large read-only scene queries
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from connection import close_client, is_connection_error
+
+
+class ReaderPool:
+    """Up to `size` extra (client, sim) pairs from `factory()`, opened on first use.
+
+    map() runs the first chunk of a query on the caller's own sim and the other
+    chunks concurrently, each on its own reader connection, and returns the
+    results in chunk order. Only read-only queries may be split: calls on
+    different sockets are not ordered relative to each other.
+
+    - MCP_SIM_READERS: number of reader connections (default 0, splitting off)
+    - MCP_PARALLEL_CHUNK: fewest handles per chunk (default 250), so small
+      queries are not split
+    """
+
+    def __init__(self, factory, size: int = None, min_chunk: int = None):
+        self.factory = factory
+        self.size = size if size is not None else int(os.environ.get("MCP_SIM_READERS", "0"))
+        self.min_chunk = max(1, min_chunk if min_chunk is not None
+                             else int(os.environ.get("MCP_PARALLEL_CHUNK", "250")))
+        self.opened = 0
+        self._idle = queue.LifoQueue()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._workers = None
+
+    def parts(self, count: int) -> int:
+        """Number of chunks to split a query over `count` handles into."""
+        return max(1, min(self.size + 1, count // self.min_chunk))
+
+    def map(self, func, chunks: list, sim) -> list:
+        """Return [func(sim, chunk) for chunk in chunks], computed concurrently."""
+        with self._lock:
+            if self._workers is None:
+                self._workers = ThreadPoolExecutor(max_workers=max(1, self.size),
+                                                   thread_name_prefix="coppelia-reader")
+        futures = [self._workers.submit(self._run, func, chunk) for chunk in chunks[1:]]
+        first = func(sim, chunks[0])
+        return [first] + [future.result() for future in futures]
+
+    def _run(self, func, chunk):
+        generation = self._generation
+        try:
+            client, sim = self._idle.get_nowait()
+        except queue.Empty:
+            client, sim = self.factory()
+            self.opened += 1
+        try:
+            result = func(sim, chunk)
+        except Exception as e:
+            if is_connection_error(e):
+                close_client(client)
+            else:
+                self._release(generation, client, sim)
+            raise
+        self._release(generation, client, sim)
+        return result
+
+    def _release(self, generation, client, sim):
+        if generation == self._generation:
+            self._idle.put((client, sim))
+        else:
+            close_client(client)
+
+    def reset(self):
+        """Close the reader connections, e.g. after the simulator reconnected."""
+        self._generation += 1
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            close_client(client)
+
+    def shutdown(self):
+        self.reset()
+        if self._workers is not None:
+            self._workers.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,426 @@
+# Batched scene snapshots - fetch the whole scene in a constant number of round-trips
+
+import copy
+import json
+import logging
+
+from connection import is_connection_error
+
+# Lua helpers executed inside CoppeliaSim's sandbox script. Each one walks the
+# scene on the simulator side and returns columnar tables, so a scene of any size
+# costs a single ZeroMQ round-trip instead of several calls per object.
+LUA_HELPERS = {
+    "static": """
+local handles = sim.getObjectsInTree(sim.handle_scene, sim.handle_all, 0)
+local r = {handles = handles, aliases = {}, types = {}, parents = {},
+           joint_handles = {}, joint_types = {}, joint_cyclic = {}, joint_intervals = {}}
+for i = 1, #handles do
+    local h = handles[i]
+    local t = sim.getObjectType(h)
+    r.aliases[i] = sim.getObjectAlias(h)
+    r.types[i] = t
+    r.parents[i] = sim.getObjectParent(h)
+    if t == sim.object_joint_type then
+        local n = #r.joint_handles + 1
+        local cyclic, interval = sim.getJointInterval(h)
+        r.joint_handles[n] = h
+        r.joint_types[n] = sim.getJointType(h)
+        r.joint_cyclic[n] = cyclic
+        r.joint_intervals[n] = interval
+    end
+end
+return r
+""",
+    "dynamic": """
+local handles, joint_handles = ...
+local r = {positions = {}, orientations = {}, joint_positions = {}}
+for i = 1, #handles do
+    r.positions[i] = sim.getObjectPosition(handles[i], sim.handle_world)
+    r.orientations[i] = sim.getObjectOrientation(handles[i], sim.handle_world)
+end
+for i = 1, #joint_handles do
+    r.joint_positions[i] = sim.getJointPosition(joint_handles[i])
+end
+return r
+""",
+    "set_targets": """
+local handles, targets, scene = ...
+if scene and sim.getInt32Param(sim.intparam_scene_unique_id) ~= scene then
+    return -1
+end
+for i = 1, #handles do
+    sim.setJointTargetPosition(handles[i], targets[i])
+end
+return #handles
+""",
+    "probe": """
+local scene = sim.getInt32Param(sim.intparam_scene_unique_id)
+local handles = sim.getObjectsInTree(sim.handle_scene, sim.handle_all, 0)
+-- Checksum of handles, parents and aliases: changes when objects are added,
+-- removed, renamed or reparented
+local sum = 0
+for i = 1, #handles do
+    local h = handles[i]
+    local value = h * 131 + sim.getObjectParent(h)
+    local alias = sim.getObjectAlias(h)
+    for j = 1, #alias do
+        value = (value * 31 + alias:byte(j)) % 4294967291
+    end
+    sum = (sum * 1000003 + value) % 4294967291
+end
+return {scene, #handles, sum, sim.getSimulationTime()}
+""",
+}
+
+STATIC_COLUMNS = ("handles", "aliases", "types", "parents",
+                  "joint_handles", "joint_types", "joint_cyclic", "joint_intervals")
+DYNAMIC_COLUMNS = ("positions", "orientations", "joint_positions")
+
+
+
+class LuaUnavailableError(Exception):
+    """The simulator cannot run the Lua helpers (no sandbox script or no executeScriptString)."""
+
+
+def _lua_literal(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (list, tuple)):
+        return "{" + ",".join(_lua_literal(v) for v in value) + "}"
+    raise TypeError(f"Cannot pass {type(value).__name__} to a Lua helper")
+
+
+def _lua_state(sim) -> dict:
+    # Kept on the sim proxy itself, so each connection (and reconnect) starts afresh.
+    # vars() skips TracedSim.__getattr__, which would look on the wrapped object.
+    state = vars(sim).get("_mcp_lua")
+    if state is None:
+        state = {"available": True, "script": None}
+        sim._mcp_lua = state
+    return state
+
+
+def _sandbox_script(sim, state: dict):
+    """Handle of the sandbox script, looked up once per connection."""
+    if state["script"] is None:
+        try:
+            script = sim.getScript(sim.scripttype_sandbox)
+        except AttributeError as e:
+            raise LuaUnavailableError(str(e)) from e
+        except Exception as e:
+            if is_connection_error(e):
+                raise
+            raise LuaUnavailableError(f"No sandbox script: {str(e)}") from e
+        if script is None or script == -1:
+            raise LuaUnavailableError("No sandbox script")
+        state["script"] = script
+    return state["script"]
+
+
+def run_lua_helper(sim, name: str, *args):
+    """Run one of LUA_HELPERS in the sandbox script and return its result.
+
+    Raises LuaUnavailableError when the simulator cannot run helpers at all;
+    errors raised by the helper itself propagate as they are.
+    """
+    code = (f"(function(...) --[[mcp:{name}]] {LUA_HELPERS[name]} end)"
+            f"({','.join(_lua_literal(a) for a in args)})")
+    if not hasattr(sim, "executeScriptString"):
+        raise LuaUnavailableError("sim.executeScriptString is not available")
+    if hasattr(sim, "scripttype_sandboxscript"):
+        # CoppeliaSim 4.3 - 4.5
+        code, script = code + "@lua", sim.scripttype_sandboxscript
+    else:
+        script = _sandbox_script(sim, _lua_state(sim))
+    try:
+        result, value = sim.executeScriptString(code, script)
+    except Exception as e:
+        if "script does not exist" in str(e).lower():
+            raise LuaUnavailableError(str(e)) from e
+        raise
+    if result not in (0, None):
+        raise Exception(f"Lua helper '{name}' failed with code {result}")
+    return value
+
+
+def batching_available(sim) -> bool:
+    return _lua_state(sim)["available"]
+
+
+def _call_batched(sim, name: str, *args):
+    """Run a Lua helper, or return None if the simulator cannot run helpers."""
+    state = _lua_state(sim)
+    if not state["available"]:
+        return None
+    try:
+        return run_lua_helper(sim, name, *args)
+    except LuaUnavailableError as e:
+        logging.warning(f"Batched scene query unavailable, falling back to per-object calls: {str(e)}")
+        state["available"] = False
+        return None
+
+
+def _as_list(value):
+    # Empty Lua tables may come back as {} or None
+    if not value:
+        return []
+    return list(value)
+
+
+def _split(items: list, parts: int) -> list:
+    # `parts` contiguous chunks of near-equal size, in order
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _merge(parts: list, names) -> dict:
+    return {name: [value for part in parts for value in part[name]] for name in names}
+
+
+def _static_columns(sim, handles) -> dict:
+    columns = {name: [] for name in STATIC_COLUMNS}
+    columns["handles"] = list(handles)
+    for h in handles:
+        obj_type = sim.getObjectType(h)
+        columns["aliases"].append(sim.getObjectAlias(h))
+        columns["types"].append(obj_type)
+        columns["parents"].append(sim.getObjectParent(h))
+        if obj_type == sim.object_joint_type:
+            cyclic, interval = sim.getJointInterval(h)
+            columns["joint_handles"].append(h)
+            columns["joint_types"].append(sim.getJointType(h))
+            columns["joint_cyclic"].append(cyclic)
+            columns["joint_intervals"].append(interval)
+    return columns
+
+
+def fetch_static(sim, readers=None) -> dict:
+    """Fetch hierarchy, aliases, types and joint intervals as columns.
+
+    Without the batched helper, the per-object calls are split across the
+    connections of `readers` (a readers.ReaderPool) when the scene is large.
+    """
+    columns = _call_batched(sim, "static")
+    if columns is not None:
+        return {name: _as_list(columns.get(name)) for name in STATIC_COLUMNS}
+
+    handles = list(sim.getObjectsInTree(sim.handle_scene, sim.handle_all, 0))
+    parts = readers.parts(len(handles)) if readers is not None else 1
+    if parts > 1:
+        return _merge(readers.map(_static_columns, _split(handles, parts), sim), STATIC_COLUMNS)
+    return _static_columns(sim, handles)
+
+
+def _dynamic_columns(sim, handles, joint_handles) -> dict:
+    columns = _call_batched(sim, "dynamic", list(handles), list(joint_handles))
+    if columns is not None:
+        return {name: _as_list(columns.get(name)) for name in DYNAMIC_COLUMNS}
+
+    return {
+        "positions": [sim.getObjectPosition(h, -1) for h in handles],
+        "orientations": [sim.getObjectOrientation(h, -1) for h in handles],
+        "joint_positions": [sim.getJointPosition(h) for h in joint_handles],
+    }
+
+
+def fetch_dynamic(sim, handles, joint_handles, readers=None) -> dict:
+    """Fetch world poses for handles and positions for joint_handles as columns.
+
+    With `readers` (a readers.ReaderPool), a large handle set is split into
+    chunks fetched concurrently over separate connections; the columns are
+    merged back in handle order.
+    """
+    handles, joint_handles = list(handles), list(joint_handles)
+    parts = readers.parts(len(handles) + len(joint_handles)) if readers is not None else 1
+    if parts > 1:
+        chunks = list(zip(_split(handles, parts), _split(joint_handles, parts)))
+        return _merge(readers.map(lambda reader, chunk: _dynamic_columns(reader, *chunk), chunks, sim),
+                      DYNAMIC_COLUMNS)
+    return _dynamic_columns(sim, handles, joint_handles)
+
+
+def probe_scene(sim):
+    """Return (scene_key, simulation_time) in one cheap round-trip.
+
+    scene_key changes whenever a scene is loaded or objects are added or removed;
+    with the Lua helper, also when objects are renamed or reparented.
+    """
+    values = _call_batched(sim, "probe")
+    if values is not None:
+        scene_id, count, checksum, sim_time = values
+        return (scene_id, count, checksum), sim_time
+    scene_id = sim.getInt32Param(sim.intparam_scene_unique_id)
+    handles = tuple(sim.getObjectsInTree(sim.handle_scene, sim.handle_all, 0))
+    return (scene_id, handles), sim.getSimulationTime()
+
+
+def resolve_object(sim, name: str, index: "SceneIndex" = None) -> int:
+    """Resolve an alias or object path to a handle.
+
+    A cached SceneIndex answers without any round-trip. Otherwise sim.getObject is
+    used, with the deprecated sim.getObjectHandle as a last resort for old-style
+    names.
+    """
+    if index is not None:
+        matches = index.find_path(name)
+        if matches:
+            return matches[0]
+    path = name if name.startswith(("/", ".", ":")) else "/" + name
+    try:
+        return sim.getObject(path)
+    except Exception:
+        return sim.getObjectHandle(name)
+
+
+def set_joint_targets(sim, handles, targets_rad, scene_id=None) -> bool:
+    """Set the target positions of several joints in one round-trip.
+
+    With `scene_id` (the scene the handles were resolved in), nothing is set
+    and False is returned when another scene has been loaded since.
+    """
+    args = [list(handles), list(targets_rad)] + ([scene_id] if scene_id is not None else [])
+    result = _call_batched(sim, "set_targets", *args)
+    if result is not None:
+        return result != -1
+    if scene_id is not None and sim.getInt32Param(sim.intparam_scene_unique_id) != scene_id:
+        return False
+    for handle, target in zip(handles, targets_rad):
+        sim.setJointTargetPosition(handle, target)
+    return True
+
+
+def take_snapshot(sim) -> dict:
+    """Return the whole scene as a dict of parallel columns.
+
+    Object columns (handles, aliases, types, parents, positions, orientations) are
+    indexed alike; joint columns (joint_handles, joint_types, joint_cyclic,
+    joint_intervals, joint_positions) are indexed alike. Objects are listed in
+    the tree order of sim.getObjectsInTree.
+    """
+    snapshot = fetch_static(sim)
+    snapshot.update(fetch_dynamic(sim, snapshot["handles"], snapshot["joint_handles"]))
+    return snapshot
+
+
+class SceneIndex:
+    """Hash lookups over one snapshot, built in a single pass over its rows.
+
+    Lookups are by handle (`row_of`, `joint_row_of`), alias (`by_alias`), object
+    type (`by_type`) and parent handle (`children`, with -1 for top-level objects).
+    Aliases are not unique in CoppeliaSim, so `by_alias` maps to lists of handles.
+    """
+
+    def __init__(self, snapshot: dict):
+        self.snapshot = snapshot
+        self.handles = snapshot["handles"]
+        self.row_of = {}
+        self.by_alias = {}
+        self.by_type = {}
+        self.children = {}
+        for i, (handle, alias, obj_type, parent) in enumerate(zip(
+                snapshot["handles"], snapshot["aliases"], snapshot["types"], snapshot["parents"])):
+            self.row_of[handle] = i
+            self.by_alias.setdefault(alias, []).append(handle)
+            self.by_type.setdefault(obj_type, []).append(handle)
+            self.children.setdefault(parent, []).append(handle)
+        self.joint_row_of = {h: i for i, h in enumerate(snapshot["joint_handles"])}
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __contains__(self, handle):
+        return handle in self.row_of
+
+    def alias(self, handle) -> str:
+        return self.snapshot["aliases"][self.row_of[handle]]
+
+    def object_type(self, handle) -> int:
+        return self.snapshot["types"][self.row_of[handle]]
+
+    def parent(self, handle) -> int:
+        return self.snapshot["parents"][self.row_of[handle]]
+
+    def is_joint(self, handle) -> bool:
+        return handle in self.joint_row_of
+
+    def find(self, alias: str) -> list:
+        return self.by_alias.get(alias, [])
+
+    def find_path(self, path: str) -> list:
+        """Return the handles matching an object path such as "/UR5/joint" or "joint".
+
+        Like CoppeliaSim paths, each segment may be any number of levels below the
+        previous one. Falls back to a case-insensitive alias match.
+        """
+        segments = [seg for seg in path.split("/") if seg]
+        if not segments:
+            return []
+        matches = []
+        for handle in self.find(segments[-1]):
+            ancestor = self.parent(handle)
+            pending = segments[:-1]
+            while pending and ancestor in self.row_of:
+                if self.alias(ancestor) == pending[-1]:
+                    pending = pending[:-1]
+                ancestor = self.parent(ancestor)
+            if not pending:
+                matches.append(handle)
+        if not matches and len(segments) == 1:
+            wanted = segments[0].lower()
+            matches = [h for alias, handles in self.by_alias.items()
+                       if alias.lower() == wanted for h in handles]
+        return matches
+
+    def of_type(self, obj_type: int) -> list:
+        return self.by_type.get(obj_type, [])
+
+    def top_level(self) -> list:
+        return self.children.get(-1, [])
+
+    def with_dynamic(self, dynamic: dict):
+        """Return an index sharing this one's lookups, with fresh dynamic columns."""
+        other = copy.copy(self)
+        other.snapshot = dict(self.snapshot, **dynamic)
+        return other
+
+    def pose(self, handle):
+        """Return (position, orientation) of an object in world coordinates."""
+        i = self.row_of[handle]
+        return self.snapshot["positions"][i], self.snapshot["orientations"][i]
+
+    def subtree(self, root) -> list:
+        """Return root and all its descendants in depth-first (tree) order."""
+        ordered = []
+        stack = [root]
+        while stack:
+            handle = stack.pop()
+            ordered.append(handle)
+            stack.extend(reversed(self.children.get(handle, [])))
+        return ordered
+
+    def joint_subtrees(self) -> set:
+        """Return the handles whose subtree contains at least one joint.
+
+        Bottom-up sweep from every joint towards the root, stopping at the first
+        ancestor already marked, so each object is visited at most once.
+        """
+        marked = set()
+        for handle in self.joint_row_of:
+            while handle in self.row_of and handle not in marked:
+                marked.add(handle)
+                handle = self.parent(handle)
+        return marked
+
+    def robots(self) -> list:
+        """Return the top-level objects whose subtree contains joints, with their subtrees."""
+        marked = self.joint_subtrees()
+        return [(base, self.subtree(base)) for base in self.top_level() if base in marked]
@@ -0,0 +1,139 @@
+# Per-client sessions of the SSE transport: bounded event queues and idle eviction
+
+import asyncio
+import os
+import time
+import uuid
+
+from logs import log
+
+
+class SessionLimitError(Exception):
+    """Raised when no more sessions can be opened."""
+
+
+class Session:
+    """One GET /sse stream and the messages POSTed for it.
+
+    Responses wait up to `send_timeout` seconds for room in the bounded queue; a
+    client that stays that far behind is disconnected. Broadcast events are
+    dropped instead when the queue is full.
+    """
+
+    def __init__(self, registry, max_queue: int):
+        self.id = uuid.uuid4().hex
+        self.registry = registry
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.inflight = 0
+        self.dropped = 0
+        self.closed = False
+        self.tasks = set()
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def offer(self, event: dict):
+        """Queue a broadcast event, or drop it if the client is behind."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def deliver(self, event: dict):
+        """Queue a response, waiting for room; disconnects a client that stays behind."""
+        if self.closed:
+            return
+        try:
+            await asyncio.wait_for(self.queue.put(event), self.registry.send_timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"⚠️ Closing SSE session {self.id}: client is not reading its responses")
+            self.registry.close(self)
+
+    def spawn(self, coro):
+        """Run coro as a task owned by the session (cancelled when it closes)."""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+class SessionRegistry:
+    """Open SSE sessions, capped in number, queue size and idle time.
+
+    - MCP_MAX_SESSIONS: open sessions (default 1000)
+    - MCP_SESSION_QUEUE: queued events and in-flight requests per session (default 100)
+    - MCP_SESSION_SEND_TIMEOUT: seconds a response waits for queue room (default 10)
+    - MCP_SESSION_IDLE_TIMEOUT: seconds without requests or delivered events
+      (including heartbeats) after which a session is closed (default 600).
+      A connected client keeps its session however long it waits; the
+      timeout reaps streams that stopped taking events, e.g. half-open
+      connections.
+    """
+
+    def __init__(self, max_sessions: int = None, max_queue: int = None,
+                 send_timeout: float = None, idle_timeout: float = None):
+        env = os.environ.get
+        self.max_sessions = max_sessions if max_sessions is not None else int(env("MCP_MAX_SESSIONS", "1000"))
+        self.max_queue = max_queue if max_queue is not None else int(env("MCP_SESSION_QUEUE", "100"))
+        self.send_timeout = send_timeout if send_timeout is not None else float(env("MCP_SESSION_SEND_TIMEOUT", "10"))
+        self.idle_timeout = (idle_timeout if idle_timeout is not None
+                             else float(env("MCP_SESSION_IDLE_TIMEOUT", "600")))
+        self.sessions = {}
+        self.evicted = 0
+        self._reaper = None
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def open(self) -> Session:
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise SessionLimitError(f"Too many open sessions ({self.max_sessions})")
+        session = Session(self, self.max_queue)
+        self.sessions[session.id] = session
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+        return session
+
+    def get(self, session_id: str) -> Session:
+        return self.sessions.get(session_id)
+
+    def close(self, session: Session):
+        session.closed = True
+        self.sessions.pop(session.id, None)
+        try:
+            session.queue.put_nowait(None)  # Wakes the stream, which then ends
+        except asyncio.QueueFull:
+            pass
+        for task in list(session.tasks):
+            task.cancel()
+
+    def evict_idle(self) -> int:
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [s for s in self.sessions.values() if s.last_active < deadline]
+        for session in idle:
+            log.info(f"Closing idle SSE session {session.id}")
+            self.close(session)
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def _reap(self):
+        while self.sessions:
+            await asyncio.sleep(min(60.0, self.idle_timeout / 4))
+            self.evict_idle()
+
+    def stats(self) -> dict:
+        sessions = list(self.sessions.values())
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "queued": sum(s.queue.qsize() for s in sessions),
+            "inflight": sum(s.inflight for s in sessions),
+            "dropped_events": sum(s.dropped for s in sessions),
+            "evicted": self.evicted,
+        }
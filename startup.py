@@ -0,0 +1,54 @@
+# Startup timing: time to ready and an optional import-time profile
+#
+# Imported first by the servers. With MCP_IMPORT_PROFILE=1 (or --profile-imports)
+# every import statement that loads a new module is timed, and mark_ready() reports
+# the slowest of the imports made directly by the server (nested imports are
+# included in their parent's time, as with `python -X importtime`).
+
+import builtins
+import os
+import sys
+import time
+
+started = time.perf_counter()
+ready_seconds = None
+_imports = None
+
+
+def _enable_profile():
+    global _imports
+    _imports = {}
+    original = builtins.__import__
+    depth = 0
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        nonlocal depth
+        if level == 0 and name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        depth += 1
+        begin = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            depth -= 1
+            if depth == 0:
+                _imports[name] = _imports.get(name, 0.0) + time.perf_counter() - begin
+
+    builtins.__import__ = timed_import
+
+
+if os.environ.get("MCP_IMPORT_PROFILE", "0") not in ("", "0") or "--profile-imports" in sys.argv:
+    _enable_profile()
+
+
+def mark_ready(top: int = 12) -> str:
+    """Record that the server is ready; returns the time to ready and the import profile, if enabled."""
+    global ready_seconds
+    if ready_seconds is None:
+        ready_seconds = time.perf_counter() - started
+    report = f"⏱️ Ready {ready_seconds * 1000:.0f} ms after start"
+    if _imports is not None:
+        slowest = sorted(_imports.items(), key=lambda item: -item[1])[:top]
+        report += f"; imports took {sum(_imports.values()) * 1000:.0f} ms, slowest:"
+        report += "".join(f"\n  {seconds * 1000:8.1f} ms  {name}" for name, seconds in slowest)
+    return report
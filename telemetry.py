@@ -0,0 +1,167 @@
+# Joint-state and pose telemetry pushed to SSE subscribers
+
+import asyncio
+import logging
+import os
+import time
+
+from jsonfast import dumps
+from connection import is_connection_error
+from scene import fetch_dynamic
+
+KINDS = ("joints", "poses")
+
+
+def sample_state(sim, cache, kinds) -> dict:
+    """Read joint positions and/or world poses in one batched round-trip.
+
+    Values are keyed by handle (as a string, for JSON). `aliases` maps the same
+    keys to object aliases. The scene is probed at most every
+    MCP_TELEMETRY_PROBE_INTERVAL seconds (default 1), so handles are refreshed
+    after a scene reload; a read that fails otherwise (e.g. on a removed
+    object) refetches the scene and is retried once.
+    """
+    try:
+        return _sample(sim, cache, kinds)
+    except Exception as e:
+        if is_connection_error(e):
+            raise
+        cache.invalidate("static")
+        return _sample(sim, cache, kinds)
+
+
+def _sample(sim, cache, kinds) -> dict:
+    index = cache.static_index(sim, max_age=float(os.environ.get("MCP_TELEMETRY_PROBE_INTERVAL", "1")))
+    static = index.snapshot
+    handles = static["handles"] if "poses" in kinds else []
+    joint_handles = static["joint_handles"] if "joints" in kinds else []
+    dynamic = fetch_dynamic(sim, handles, joint_handles, cache.readers)
+    frame = {"aliases": {str(h): index.alias(h) for h in set(handles) | set(joint_handles)}}
+    if "joints" in kinds:
+        frame["joints"] = {str(h): p for h, p in zip(joint_handles, dynamic["joint_positions"])}
+    if "poses" in kinds:
+        frame["poses"] = {str(h): list(p) + list(o) for h, p, o in
+                          zip(handles, dynamic["positions"], dynamic["orientations"])}
+    return frame
+
+
+class TelemetryLagError(Exception):
+    """Raised when a subscriber fell so far behind that its next frame was overwritten."""
+
+
+class TelemetryCursor:
+    """One subscriber's read position in the hub's ring buffer."""
+
+    def __init__(self, hub, kinds, rate):
+        self.hub = hub
+        self.kinds = kinds
+        self.period = 1.0 / rate
+        self.position = hub.seq
+        self.sent = {kind: {} for kind in kinds}
+        self.aliases_sent = set()
+
+    def delta(self, frame) -> dict:
+        """Return only the values that changed since the last delivered event."""
+        changes = {}
+        for kind in self.kinds:
+            last = self.sent[kind]
+            changed = {k: v for k, v in frame.get(kind, {}).items() if last.get(k) != v}
+            if changed:
+                changes[kind] = changed
+                last.update(changed)
+        new_keys = {k for kind in changes for k in changes[kind]} - self.aliases_sent
+        if new_keys:
+            changes["aliases"] = {k: frame["aliases"][k] for k in new_keys}
+            self.aliases_sent.update(new_keys)
+        return changes
+
+    async def next_event(self, timeout: float):
+        """Return the next 'telemetry' event, or None if none is due within timeout.
+
+        Frames are read in order, every `stride` frames to match this subscriber's
+        rate. Raises TelemetryLagError if the next frame is no longer buffered.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            hub = self.hub
+            if self.position < hub.seq - len(hub.ring):
+                raise TelemetryLagError(f"Telemetry subscriber fell {hub.seq - self.position} frames behind")
+            if self.position < hub.seq:
+                frame_time, frame = hub.ring[self.position % len(hub.ring)]
+                self.position += max(1, round(self.period / hub.period))
+                changes = self.delta(frame)
+                if changes:
+                    changes["t"] = frame_time
+                    return {"event": "telemetry", "data": dumps(changes)}
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await hub.wait_frame(remaining):
+                return None
+
+
+class TelemetryHub:
+    """A single background sampler feeding a ring buffer read by many subscribers.
+
+    The sampler reads the simulator once per tick, at the fastest rate any
+    subscriber asked for (capped by MCP_TELEMETRY_MAX_RATE), so simulator traffic
+    does not grow with the number of subscribers. Each subscriber reads the buffer
+    through its own TelemetryCursor, receiving only values that changed since its
+    previous event. The buffer holds MCP_TELEMETRY_BUFFER frames; a subscriber that
+    falls further behind is dropped instead of letting memory grow.
+    """
+
+    def __init__(self, sample, run, capacity: int = None):
+        if capacity is None:
+            capacity = int(os.environ.get("MCP_TELEMETRY_BUFFER", "256"))
+        self._sample = sample  # blocking callable(kinds) -> frame
+        self._run = run  # coroutine runner, e.g. SimExecutor.run
+        self.ring = [None] * max(1, capacity)
+        self.seq = 0
+        self.period = 1.0
+        self.max_rate = float(os.environ.get("MCP_TELEMETRY_MAX_RATE", "50"))
+        self._cursors = set()
+        self._task = None
+        self._new_frame = None
+
+    def subscribe(self, kinds, rate: float) -> TelemetryCursor:
+        kinds = tuple(k for k in KINDS if k in kinds) or ("joints",)
+        cursor = TelemetryCursor(self, kinds, min(max(rate, 0.1), self.max_rate))
+        self._cursors.add(cursor)
+        self.period = min(c.period for c in self._cursors)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sampler())
+        return cursor
+
+    def unsubscribe(self, cursor: TelemetryCursor):
+        self._cursors.discard(cursor)
+        if self._cursors:
+            self.period = min(c.period for c in self._cursors)
+
+    async def wait_frame(self, timeout: float) -> bool:
+        """Wait until the sampler publishes a new frame; False on timeout."""
+        if self._new_frame is None:
+            self._new_frame = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._new_frame.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _sampler(self):
+        loop = asyncio.get_running_loop()
+        while self._cursors:
+            started = loop.time()
+            kinds = {kind for cursor in self._cursors for kind in cursor.kinds}
+            try:
+                frame = await self._run(self._sample, kinds)
+            except Exception as e:
+                logging.warning(f"Telemetry sample failed: {str(e)}")
+                frame = None
+            if frame is not None:
+                self.ring[self.seq % len(self.ring)] = (time.time(), frame)
+                self.seq += 1
+                if self._new_frame is not None:
+                    self._new_frame.set()
+                    self._new_frame = None
+            await asyncio.sleep(max(0.0, self.period - (loop.time() - started)))
@@ -1,130 +1,222 @@
 import math
 import logging
+from connection import is_connection_error
+from scene import take_snapshot, fetch_static, set_joint_targets, SceneIndex, resolve_object
 
-def rotate_joint(sim, joint_name: str, angle_deg: float):
+def _cached(sim, cache, name, build):
+    # Without a cache every call reads a fresh snapshot
+    if cache is None:
+        return build(SceneIndex(take_snapshot(sim)))
+    return cache.result(sim, name, build)
+
+def _resolve_name(sim, name, cache=None, index=None):
+    # Invalid params for a name that matches no object, unlike a failed connection
+    try:
+        if cache is not None:
+            return cache.resolve(sim, name)
+        return resolve_object(sim, name, index)
+    except Exception as e:
+        if is_connection_error(e):
+            raise
+        raise ValueError(f"Unknown object '{name}'") from e
+
+def rotate_joint(sim, joint_name: str, angle_deg: float, cache=None):
     if sim is None:
         raise Exception("CoppeliaSim not connected")
-    joint_handle = sim.getObjectHandle(joint_name)
     angle_rad = math.radians(angle_deg)
-    sim.setJointTargetPosition(joint_handle, angle_rad)
+    if cache is None:
+        sim.setJointTargetPosition(_resolve_name(sim, joint_name), angle_rad)
+        return f"Joint '{joint_name}' rotated to {angle_deg} degrees."
+    joint_handle = _resolve_name(sim, joint_name, cache)
+    try:
+        # Also checks that the scene the handle was resolved in is still loaded
+        moved = set_joint_targets(sim, [joint_handle], [angle_rad], cache.scene_id)
+    except Exception as e:
+        if is_connection_error(e):
+            raise
+        if sim.isHandle(joint_handle):
+            if not cache.static_index(sim).is_joint(joint_handle):
+                raise ValueError(f"'{joint_name}' is not a joint")
+            raise
+        moved = False
+    if not moved:
+        # The joint was removed or the scene reloaded: resolve it again
+        cache.invalidate()
+        joint_handle = _resolve_name(sim, joint_name, cache)
+        set_joint_targets(sim, [joint_handle], [angle_rad])
+    cache.invalidate("dynamic")
     return f"Joint '{joint_name}' rotated to {angle_deg} degrees."
 
-def describe_robot(sim):
+def _resolve_joints(sim, index, cache, joint_names):
+    # Joint names may be aliases, object paths or raw handles
+    handles = []
+    for name in joint_names:
+        if isinstance(name, int):
+            handle = name
+        else:
+            handle = _resolve_name(sim, name, cache, index)
+        if not index.is_joint(handle):
+            raise ValueError(f"'{name}' is not a joint")
+        handles.append(handle)
+    return handles
+
+def _check_limits(index, joint_names, handles, angles_deg, where=""):
+    snapshot = index.snapshot
+    errors = []
+    for name, handle, angle in zip(joint_names, handles, angles_deg):
+        row = index.joint_row_of[handle]
+        if snapshot["joint_cyclic"][row]:
+            continue
+        low, span = snapshot["joint_intervals"][row]
+        if not low - 1e-9 <= math.radians(angle) <= low + span + 1e-9:
+            errors.append(f"'{name}' to {angle} degrees (limits: {math.degrees(low)}, {math.degrees(low + span)})")
+    if errors:
+        raise ValueError(f"Joint limits exceeded{where}: " + "; ".join(errors))
+
+def _joint_index(sim, cache, joint_names):
+    index = cache.static_index(sim) if cache is not None else SceneIndex(fetch_static(sim))
+    return index, _resolve_joints(sim, index, cache, joint_names)
+
+def set_joint_positions(sim, joints: dict = None, joint_names: list = None, angles_deg: list = None, cache=None):
+    if sim is None:
+        raise Exception("CoppeliaSim not connected")
+    if joints:
+        joint_names = list(joints.keys())
+        angles_deg = list(joints.values())
+    if not joint_names or angles_deg is None or len(joint_names) != len(angles_deg):
+        raise ValueError("Provide 'joints' as {name: angle_deg}, or 'joint_names' and 'angles_deg' of equal length")
+    angles_rad = [math.radians(a) for a in angles_deg]
+    index, handles = _joint_index(sim, cache, joint_names)
+    _check_limits(index, joint_names, handles, angles_deg)
+    if cache is None:
+        set_joint_targets(sim, handles, angles_rad)
+    else:
+        try:
+            moved = set_joint_targets(sim, handles, angles_rad, cache.scene_id)
+        except Exception as e:
+            if is_connection_error(e):
+                raise
+            moved = False
+        if not moved:
+            # A joint may have been removed or the scene reloaded: resolve again once
+            cache.invalidate()
+            index, handles = _joint_index(sim, cache, joint_names)
+            _check_limits(index, joint_names, handles, angles_deg)
+            set_joint_targets(sim, handles, angles_rad)
+        cache.invalidate("dynamic")
+    moves = ", ".join(f"'{name}' to {angle} degrees" for name, angle in zip(joint_names, angles_deg))
+    return f"Joints set: {moves}."
+
+def execute_trajectory(sim, joint_names: list, waypoints, steps_per_waypoint: int = 1,
+                       client=None, cache=None, progress=None, progress_every: int = None):
+    if sim is None:
+        raise Exception("CoppeliaSim not connected")
+    # Accept NumPy arrays as well as nested lists (time x joints, in degrees)
+    if hasattr(waypoints, "tolist"):
+        waypoints = waypoints.tolist()
+    waypoints = [list(row) for row in waypoints]
+    if not joint_names or not waypoints:
+        raise ValueError("Provide 'joint_names' and at least one waypoint")
+    for i, row in enumerate(waypoints):
+        if len(row) != len(joint_names):
+            raise ValueError(f"Waypoint {i} has {len(row)} values, expected {len(joint_names)}")
+    index, handles = _joint_index(sim, cache, joint_names)
+    for i, row in enumerate(waypoints):
+        _check_limits(index, joint_names, handles, row, where=f" at waypoint {i}")
+
+    # Stepping is per client: prefer the client API, as older servers only offer it there
+    stepper = client if client is not None else sim
+    stepper.setStepping(True)
     try:
-        # Get all objects in the scene
-        all_handles = sim.getObjectsInTree(sim.handle_scene, sim.handle_all)
-        # Find top-level objects (parentless)
-        top_level_handles = [h for h in all_handles if sim.getObjectParent(h) == -1]
-        robots = []
-        for base_handle in top_level_handles:
-            # Check if this subtree contains joints (i.e., is a robot)
-            joint_handles = sim.getObjectsInTree(base_handle, sim.object_joint_type)
-            if isinstance(joint_handles, int) and joint_handles == -1:
-                joint_handles = []
-            if not joint_handles:
-                continue  # Not a robot
-            # Collect all elements in this robot
-            subtree_handles = sim.getObjectsInTree(base_handle, sim.handle_all)
-            elements = []
-            for h in subtree_handles:
-                obj_type = sim.getObjectType(h)
-                name = sim.getObjectAlias(h)
-                position = sim.getObjectPosition(h, -1)
-                orientation = sim.getObjectOrientation(h, -1)
-                elements.append({
-                    "handle": h,
-                    "name": name,
-                    "type": obj_type,
-                    "position": position,
-                    "orientation": orientation
-                })
-            robots.append({
-                "base_handle": base_handle,
-                "base_name": sim.getObjectAlias(base_handle),
-                "elements": elements
+        if sim.getSimulationState() == sim.simulation_stopped:
+            sim.startSimulation()
+        total = len(waypoints)
+        if not progress_every:
+            progress_every = max(1, total // 20)
+        for i, row in enumerate(waypoints):
+            set_joint_targets(sim, handles, [math.radians(a) for a in row])
+            for _ in range(max(1, steps_per_waypoint)):
+                stepper.step()
+            if progress is not None and ((i + 1) % progress_every == 0 or i + 1 == total):
+                progress({"step": i + 1, "total": total, "sim_time": sim.getSimulationTime()})
+    finally:
+        stepper.setStepping(False)
+        if cache is not None:
+            cache.invalidate("dynamic")
+    return f"Trajectory executed: {len(waypoints)} waypoints on {len(joint_names)} joints."
+
+def _robot_list(index):
+    robots = []
+    for base_handle, members in index.robots():
+        elements = []
+        for h in members:
+            position, orientation = index.pose(h)
+            elements.append({
+                "handle": h,
+                "name": index.alias(h),
+                "type": index.object_type(h),
+                "position": position,
+                "orientation": orientation
             })
-        type_map = {
-            0: "shape",
-            1: "joint",
-            2: "graph",
-            3: "camera",
-            4: "light",
-            5: "dummy",
-            6: "proximity sensor",
-            7: "octree",
-            8: "point cloud",
-            9: "vision sensor",
-            10: "force sensor",
-            11: "script"
-        }
-        if not robots:
-            text = "No robots found in the scene."
-        else:
-            text = ""
-            for robot in robots:
-                text += f"Robot base: {robot['base_name']} (handle: {robot['base_handle']})\n"
-                for elem in robot['elements']:
-                    type_name = type_map.get(elem['type'], f"unknown({elem['type']})")
-                    text += (
-                        f"  - {elem['name']} (type: {type_name}, handle: {elem['handle']}, "
-                        f"pos: {elem['position']}, orient: {elem['orientation']})\n"
-                    )
-                text += "\n"
-        return text
+        robots.append({
+            "base_handle": base_handle,
+            "base_name": index.alias(base_handle),
+            "elements": elements
+        })
+    return robots
+
+def describe_robot(sim, cache=None):
+    try:
+        return _cached(sim, cache, "describe_robot", _robot_list)
     except Exception as e:
         logging.exception(f"Error in describe_robot: {str(e)}")
         raise Exception(f"Internal error in describe_robot: {str(e)}")
 
-def list_joints(sim):
+def _joint_list(index):
+    snapshot = index.snapshot
+    joints = []
+    for i, handle in enumerate(snapshot["joint_handles"]):
+        cyclic = snapshot["joint_cyclic"][i]
+        interval = snapshot["joint_intervals"][i]
+        if cyclic:
+            limits_deg = ["Cyclic", "Cyclic"]
+        else:
+            min_value = interval[0]
+            range_value = interval[1]
+            limits_deg = [math.degrees(min_value), math.degrees(min_value + range_value)]
+        joints.append({
+            "id": handle,
+            "alias": index.alias(handle),
+            "position": snapshot["joint_positions"][i],
+            "type": snapshot["joint_types"][i],
+            "limits_deg": limits_deg
+        })
+    return joints
+
+def list_joints(sim, cache=None):
     try:
-        joint_handles = sim.getObjectsInTree(sim.handle_scene, sim.object_joint_type)
-        if isinstance(joint_handles, int) and joint_handles == -1:
-            raise Exception("Failed to retrieve joint handles. Check object type and scene setup.")
-        joints = []
-        for handle in joint_handles:
-            name = sim.getObjectAlias(handle)
-            joint_type = sim.getJointType(handle)
-            cyclic, interval = sim.getJointInterval(handle)
-            if cyclic:
-                limits_deg = ["Cyclic", "Cyclic"]
-            else:
-                min_value = interval[0]
-                range_value = interval[1]
-                limits_deg = [math.degrees(min_value), math.degrees(min_value + range_value)]
-            position = sim.getJointPosition(handle)
-            joints.append({
-                "id": handle,
-                "alias": name,
-                "position": position,
-                "type": joint_type,
-                "limits_deg": limits_deg
-            })
-        return joints
+        return _cached(sim, cache, "list_joints", _joint_list)
     except Exception as e:
         logging.error(f"Error in list_joints: {str(e)}")
         raise Exception(f"Internal error: {str(e)}")
 
-def describe_scene(sim):
+def _scene_objects(index):
+    objects = []
+    for handle in index.handles:
+        if index.is_joint(handle):
+            continue  # Skip robot joints
+        position, orientation = index.pose(handle)
+        objects.append({
+            "name": index.alias(handle),
+            "type": index.object_type(handle),
+            "position": position,
+            "orientation": orientation
+        })
+    return objects
+
+def describe_scene(sim, cache=None):
     try:
-        object_handles = sim.getObjectsInTree(sim.handle_scene)
-        joint_handles = sim.getObjects(sim.object_joint_type, -1)
-        if isinstance(joint_handles, int) and joint_handles == -1:
-            joint_handles = []
-        objects = []
-        for handle in object_handles:
-            if handle in joint_handles:
-                continue  # Skip robot joints
-            name = sim.getObjectAlias(handle)
-            obj_type = sim.getObjectType(handle)
-            position = sim.getObjectPosition(handle, -1)
-            orientation = sim.getObjectOrientation(handle, -1)
-            objects.append({
-                "name": name,
-                "type": obj_type,
-                "position": position,
-                "orientation": orientation
-            })
-        return objects
+        return _cached(sim, cache, "describe_scene", _scene_objects)
     except Exception as e:
         logging.exception(f"Error in describe_scene: {str(e)}")
-        raise Exception(f"Internal error in describe_scene: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Internal error in describe_scene: {str(e)}")
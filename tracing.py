@@ -0,0 +1,125 @@
+# Transparent proxy around the remote `sim` object that traces every call
+
+import contextlib
+import itertools
+import os
+import re
+import threading
+import time
+
+from jsonfast import dumps
+
+_HELPER_MARKER = re.compile(r"--\[\[mcp:(\w+)\]\]")
+_trace_ids = itertools.count(1)
+
+
+class TracedSim:
+    """Forwards everything to `sim`, recording per-function counts, latency and bytes.
+
+    `traffic` is a dict of running byte totals for the client's socket (such as
+    Metrics.zmq); each call is charged the bytes that moved while it ran. Without
+    it, sizes are reported as 0. Constants are passed through untouched.
+
+    When `trace_dir` (default MCP_TRACE_DIR) is set, every call inside trace() is
+    also recorded as a Chrome trace event, and each trace is written there as a
+    JSON file that chrome://tracing or Perfetto can open. Without it, trace()
+    records nothing.
+    """
+
+    def __init__(self, sim, traffic: dict = None, trace_dir: str = None):
+        self._sim = sim
+        self._traffic = traffic
+        self._trace_dir = trace_dir if trace_dir is not None else os.environ.get("MCP_TRACE_DIR")
+        self._events = None
+        self.calls = {}
+
+    def __getattr__(self, name):
+        value = getattr(self._sim, name)
+        if callable(value):
+            value = self._wrap(name, value)
+        # Cache on the proxy so later lookups skip __getattr__
+        self.__dict__[name] = value
+        return value
+
+    def _wrap(self, name, func):
+        def call(*args, **kwargs):
+            label = name
+            if name == "executeScriptString" and args:
+                # Name batched Lua helpers (scene.LUA_HELPERS) after their marker
+                marker = _HELPER_MARKER.search(str(args[0]))
+                if marker:
+                    label = f"{name}[{marker.group(1)}]"
+            traffic = self._traffic
+            sent = traffic["bytes_sent"] if traffic else 0
+            received = traffic["bytes_received"] if traffic else 0
+            started = time.perf_counter()
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                sent = traffic["bytes_sent"] - sent if traffic else 0
+                received = traffic["bytes_received"] - received if traffic else 0
+                self._record(label, started, elapsed, sent, received, failed)
+        call.__name__ = name
+        return call
+
+    def _record(self, label, started, elapsed, sent, received, failed):
+        stats = self.calls.get(label)
+        if stats is None:
+            stats = self.calls[label] = {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                         "bytes_sent": 0, "bytes_received": 0}
+        ms = elapsed * 1000
+        stats["count"] += 1
+        stats["errors"] += failed
+        stats["total_ms"] += ms
+        stats["max_ms"] = max(stats["max_ms"], ms)
+        stats["bytes_sent"] += sent
+        stats["bytes_received"] += received
+        if self._events is not None:
+            self._events.append({
+                "name": label, "cat": "sim", "ph": "X",
+                "ts": started * 1e6, "dur": elapsed * 1e6,
+                "pid": os.getpid(), "tid": threading.get_ident(),
+                "args": {"bytes_sent": sent, "bytes_received": received, "error": failed}
+            })
+
+    @contextlib.contextmanager
+    def trace(self, name: str = "trace"):
+        """Record every sim call in the block; yields the Chrome trace dict (None without trace_dir)."""
+        if not self._trace_dir:
+            # The events would only be thrown away
+            yield None
+            return
+        result = {"traceEvents": [], "displayTimeUnit": "ms"}
+        self._events = result["traceEvents"]
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            self._events = None
+            result["traceEvents"].insert(0, {
+                "name": name, "cat": "tool", "ph": "X",
+                "ts": started * 1e6, "dur": (time.perf_counter() - started) * 1e6,
+                "pid": os.getpid(), "tid": threading.get_ident(),
+                "args": {"sim_calls": len(result["traceEvents"])}
+            })
+            path = os.path.join(self._trace_dir,
+                                f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{next(_trace_ids)}.json")
+            with open(path, "w") as f:
+                f.write(dumps(result))
+
+    def stats(self) -> dict:
+        """Per-function totals, slowest first by total time."""
+        return dict(sorted(((label, dict(s)) for label, s in list(self.calls.items())),
+                           key=lambda item: -item[1]["total_ms"]))
+
+
+def trace(sim, name: str):
+    """sim.trace(name) for a TracedSim writing traces, a no-op context otherwise."""
+    if isinstance(sim, TracedSim) and sim._trace_dir:
+        return sim.trace(name)
+    return contextlib.nullcontext()